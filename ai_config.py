@@ -0,0 +1,13 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True, frozen=True)
+class AIConfig:
+    """
+    Connection settings for the AI deployment used by the PromptProcessor.
+    Built once at startup and passed by reference; the API key is left out of the repr.
+    """
+    model_name: str
+    api_key: str = field(repr=False)
+    endpoint: str
+    api_version: str
@@ -1,22 +1,21 @@
 import os
+import time
 import logging
+import threading
+from typing import Optional
+import requests
+from urllib3.util.retry import Retry
 from azure.storage.blob import BlobServiceClient
-from azure.core.exceptions import ResourceNotFoundError, AzureError
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import RequestsTransport
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError, AzureError
 import dotenv
 
 dotenv.load_dotenv()
 
-# Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Handler for console output
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-
 # Import DefaultAzureCredential at module level for proper mocking in tests
 try:
     from azure.identity import DefaultAzureCredential
@@ -25,12 +24,76 @@ except ImportError:
     DefaultAzureCredential = None
     _default_credential_available = False
 
+# Persistent token caching needs a newer azure-identity than DefaultAzureCredential itself
+try:
+    from azure.identity import TokenCachePersistenceOptions
+except ImportError:
+    TokenCachePersistenceOptions = None
+
+# Credential shared by every client so its in-memory token cache is reused
+_shared_credential: Optional["DefaultAzureCredential"] = None
+_credential_lock = threading.Lock()
+
+def _build_credential():
+    """
+    Create the DefaultAzureCredential, optionally backed by a persistent token cache.
+    Setting AZURE_TOKEN_CACHE_PERSISTENCE=true stores tokens in the MSAL cache on disk
+    so a restarted process can reuse them until they expire. Only the workload identity
+    and service principal (environment) credentials use this cache; managed identity
+    keeps its tokens in memory regardless. Containers usually have no keyring, so
+    AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED=true is needed to allow a plain-text cache.
+    """
+    if os.getenv("AZURE_TOKEN_CACHE_PERSISTENCE", "false").lower() != "true":
+        return DefaultAzureCredential()
+
+    if TokenCachePersistenceOptions is None:
+        logger.warning("Persistent token cache requires a newer azure-identity; using the in-memory cache")
+        return DefaultAzureCredential()
+
+    cache_options = TokenCachePersistenceOptions(
+        name=os.getenv("AZURE_TOKEN_CACHE_NAME", "sk-consumer"),
+        allow_unencrypted_storage=os.getenv("AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED", "false").lower() == "true"
+    )
+    logger.info("Using persistent token cache for Azure credentials")
+    return DefaultAzureCredential(cache_persistence_options=cache_options)
+
+def _get_credential():
+    """
+    Return the process-wide DefaultAzureCredential, creating it on first use.
+    """
+    global _shared_credential
+    if _shared_credential is None:
+        with _credential_lock:
+            if _shared_credential is None:
+                _shared_credential = _build_credential()
+    return _shared_credential
+
+def _build_transport(max_concurrency: int) -> RequestsTransport:
+    """
+    Create an HTTP transport whose connection pool can serve every parallel range
+    request of a download, so connections are reused instead of being discarded
+    with "Connection pool is full" warnings. The pool never shrinks below the
+    requests default of 10. Retries stay disabled at the HTTP level, as in the
+    session azure-core builds itself, so the SDK retry policy is the only one.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+        pool_maxsize=max(10, max_concurrency + 2)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=True)
+
 class AzureBlobTemplateClient:
     """
     Client for retrieving prompt templates from Azure Blob Storage.
     Uses connection string from environment variable for local dev,
     or managed identity when deployed to Azure.
     Container name can be provided as an argument or via PROMPT_TEMPLATE_CONTAINER_NAME env var.
+    Downloaded templates are cached in memory for PROMPT_TEMPLATE_TTL_SECONDS (default 600).
+    Once the TTL expires the cached copy keeps being served while a background thread
+    revalidates it with a conditional GET on the blob ETag.
     """
     def __init__(self, account_name: str = None, container_name: str = None):
         # Get container name from argument or environment
@@ -43,13 +106,24 @@ class AzureBlobTemplateClient:
         self.blob_service_client = None
         self.container_client = None
         
+        # Template cache keyed by blob name: (content, etag, fetched_at)
+        self._cache: dict[str, tuple[str, str, float]] = {}
+        self._ttl_seconds = int(os.getenv("PROMPT_TEMPLATE_TTL_SECONDS", "600"))
+        # Blob names with a background refresh in flight, so each gets at most one
+        self._refreshing: set[str] = set()
+        self._refresh_lock = threading.Lock()
+        
+        # Parallel range requests per download; the connection pool is sized to match
+        self._max_concurrency = int(os.getenv("PROMPT_TEMPLATE_DOWNLOAD_CONCURRENCY", "4"))
+        transport = _build_transport(self._max_concurrency)
+        
         # Get connection string from environment
         connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         
         if connection_string:
             # Use connection string for local development
             logger.info("Using Azure Storage connection string")
-            self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+            self.blob_service_client = BlobServiceClient.from_connection_string(connection_string, transport=transport)
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
         else:
             # Use managed identity for production
@@ -66,18 +140,21 @@ class AzureBlobTemplateClient:
                 raise ImportError("azure-identity package is required for managed identity authentication")
             
             try:
-                credential = DefaultAzureCredential()
-                self.blob_service_client = BlobServiceClient(account_url=account_url, credential=credential)
+                credential = _get_credential()
+                self.blob_service_client = BlobServiceClient(account_url=account_url, credential=credential, transport=transport)
                 self.container_client = self.blob_service_client.get_container_client(self.container_name)
                 self.account_name = account_name
             except Exception as e:
-                logger.error(f"Failed to authenticate with managed identity: {e}")
+                logger.error("Failed to authenticate with managed identity: %s", e)
                 raise
 
     def get_template(self, blob_name: str = None) -> str:
         """
         Download and return the contents of a template blob as a string.
         If blob_name is not provided, it is read from the environment variable PROMPT_TEMPLATE_BLOB_NAME.
+        A cached template is always returned immediately; once it is older than the TTL a
+        background refresh is started so a later call sees the new content. Only the first
+        request for a blob downloads it inline.
         Handles errors and logs appropriately.
         """
         if blob_name is None:
@@ -85,21 +162,88 @@ class AzureBlobTemplateClient:
             if not blob_name:
                 logger.error("PROMPT_TEMPLATE_BLOB_NAME environment variable is not set and no blob_name was provided.")
                 raise ValueError("Template blob name must be provided either as an argument or via PROMPT_TEMPLATE_BLOB_NAME environment variable.")
+
+        cached = self._cache.get(blob_name)
+        if cached is None:
+            return self._fetch_template(blob_name)
+
+        if time.monotonic() - cached[2] >= self._ttl_seconds:
+            self._start_refresh(blob_name)
+        return cached[0]
+
+    def _start_refresh(self, blob_name: str):
+        """
+        Revalidate a stale template on a daemon thread unless a refresh is already running.
+        """
+        with self._refresh_lock:
+            if blob_name in self._refreshing:
+                return
+            self._refreshing.add(blob_name)
+
+        thread = threading.Thread(
+            target=self._refresh_template,
+            args=(blob_name,),
+            name=f"template-refresh-{blob_name}",
+            daemon=True
+        )
+        thread.start()
+
+    def _refresh_template(self, blob_name: str):
+        """
+        Background refresh body; a failure keeps the stale copy and is retried on a later call.
+        """
+        try:
+            self._fetch_template(blob_name)
+        except Exception as e:
+            logger.warning("Background refresh of template '%s' failed, serving cached copy: %s", blob_name, e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(blob_name)
+
+    def _fetch_template(self, blob_name: str) -> str:
+        """
+        Download a template and store it in the cache.
+        A cached entry is revalidated with its ETag so an unchanged template costs no download.
+        """
+        cached = self._cache.get(blob_name)
         try:
             blob_client = self.container_client.get_blob_client(blob_name)
-            blob_data = blob_client.download_blob().content_as_text(encoding='utf-8')
-            logger.info(f"Successfully downloaded blob: {blob_name}")
+            if cached is None:
+                downloader = blob_client.download_blob(max_concurrency=self._max_concurrency)
+            else:
+                downloader = blob_client.download_blob(
+                    max_concurrency=self._max_concurrency,
+                    etag=cached[1],
+                    match_condition=MatchConditions.IfModified
+                )
+            blob_data = downloader.content_as_text(encoding='utf-8')
+            self._cache[blob_name] = (blob_data, downloader.properties.etag, time.monotonic())
+            logger.info("Successfully downloaded blob: %s", blob_name)
             return blob_data
+        except ResourceNotModifiedError:
+            logger.info("Blob not modified, reusing cached template: %s", blob_name)
+            self._cache[blob_name] = (cached[0], cached[1], time.monotonic())
+            return cached[0]
         except ResourceNotFoundError:
-            logger.error(f"Blob not found: {blob_name}")
+            logger.error("Blob not found: %s", blob_name)
             raise FileNotFoundError(f"Template blob '{blob_name}' not found.")
         except AzureError as e:
-            logger.error(f"Azure error while downloading blob '{blob_name}': {e}")
+            logger.error("Azure error while downloading blob '%s': %s", blob_name, e)
             raise
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             raise
 
+    def close(self):
+        """
+        Close the underlying BlobServiceClient and release its pooled connections.
+        """
+        if self.blob_service_client is not None:
+            try:
+                self.blob_service_client.close()
+            except Exception as e:
+                logger.warning("Error while closing BlobServiceClient: %s", e)
+
 # Usage example (should be in your main or service code):
 # from blob_client import AzureBlobTemplateClient
 # client = AzureBlobTemplateClient()  # Uses PROMPT_TEMPLATE_CONTAINER_NAME env var
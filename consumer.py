@@ -5,40 +5,66 @@ import asyncio
 import logging
 import signal
 import sys
-from azure.servicebus import ServiceBusMessage
-from azure.servicebus.aio import ServiceBusClient as AsyncServiceBusClient
-from prompt_processor import PromptProcessor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 
-dotenv.load_dotenv()
+# The Azure SDKs and Semantic Kernel are imported where they are first used so
+# that environment validation and other fast-fail paths don't pay for loading them
+if TYPE_CHECKING:
+    from prompt_processor import PromptProcessor
 
-import json
+import orjson
+from ai_config import AIConfig
+from settler import MessageSettler
 
-# Configure logging FIRST, before any other operations
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-
-# Set these as environment variables for security
-SERVICE_BUS_CONNECTION_STR = os.getenv('SERVICE_BUS_CONNECTION_STR')
-QUEUE_NAME = os.getenv('SERVICE_BUS_QUEUE_NAME')
+
 BATCH_SIZE = 10  # Number of messages to receive in a batch
+DEFAULT_PREFETCH_COUNT = BATCH_SIZE * 2  # Messages buffered on the link while a batch is processed
+
+# Service Bus connection tuning; the SDK retries transient link failures itself
+# before the error reaches the reconnect loop below
+SERVICE_BUS_RETRY_BACKOFF_FACTOR = 0.8  # seconds
+SERVICE_BUS_RETRY_BACKOFF_MAX = 30  # seconds
+
+# receive_messages waits on the link for up to this long, so an idle queue is
+# polled without any extra sleep in the loop
+RECEIVE_MAX_WAIT_TIME = 5  # seconds
+
+# The pause after a failed receive starts short, doubles while failures persist and
+# resets after the next successful receive
+ERROR_BACKOFF_MIN = 0.5  # seconds
+ERROR_BACKOFF_MAX = 5.0  # seconds
 
 # Graceful shutdown configuration
-SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', '30'))  # seconds
+DEFAULT_SHUTDOWN_TIMEOUT = 30  # seconds
 shutdown_event = asyncio.Event()
 
+@dataclass(frozen=True)
+class ConsumerConfig:
+    """
+    Settings read from the environment once at startup.
+    Secrets are left out of the repr so the config is safe to log.
+    """
+    service_bus_connection_str: str = field(repr=False)
+    queue_name: str
+    ai: AIConfig
+    shutdown_timeout: int = DEFAULT_SHUTDOWN_TIMEOUT
+    retry_total: int = 5
+    use_websockets: bool = False
+    prefetch_count: int = DEFAULT_PREFETCH_COUNT
+    receiver_count: int = 1
+
 def validate_environment_variables():
     """
     Validate all required environment variables at startup.
     Raises ValueError with clear message if any variables are missing.
+    Returns a ConsumerConfig built from the environment.
     """
     required_vars = {
-        'SERVICE_BUS_CONNECTION_STR': SERVICE_BUS_CONNECTION_STR,
-        'SERVICE_BUS_QUEUE_NAME': QUEUE_NAME,
+        'SERVICE_BUS_CONNECTION_STR': os.getenv('SERVICE_BUS_CONNECTION_STR'),
+        'SERVICE_BUS_QUEUE_NAME': os.getenv('SERVICE_BUS_QUEUE_NAME'),
         'AI_MODEL_NAME': os.getenv('AI_MODEL_NAME'),
         'AI_API_KEY': os.getenv('AI_API_KEY'),
         'AI_ENDPOINT': os.getenv('AI_ENDPOINT'),
@@ -54,14 +80,21 @@ def validate_environment_variables():
         raise ValueError(error_msg)
     
     logger.info("All required environment variables are present")
-    return {var_name: var_value for var_name, var_value in required_vars.items()}
-
-# Validate environment variables at startup
-try:
-    env_vars = validate_environment_variables()
-except ValueError as e:
-    logger.critical(f"Environment validation failed: {e}")
-    raise
+    return ConsumerConfig(
+        service_bus_connection_str=required_vars['SERVICE_BUS_CONNECTION_STR'],
+        queue_name=required_vars['SERVICE_BUS_QUEUE_NAME'],
+        ai=AIConfig(
+            model_name=required_vars['AI_MODEL_NAME'],
+            api_key=required_vars['AI_API_KEY'],
+            endpoint=required_vars['AI_ENDPOINT'],
+            api_version=required_vars['API_VERSION']
+        ),
+        shutdown_timeout=int(os.getenv('SHUTDOWN_TIMEOUT', str(DEFAULT_SHUTDOWN_TIMEOUT))),
+        retry_total=int(os.getenv('SERVICE_BUS_RETRY_TOTAL', '5')),
+        use_websockets=os.getenv('SERVICE_BUS_USE_WEBSOCKETS', 'false').lower() == 'true',
+        prefetch_count=int(os.getenv('SERVICE_BUS_PREFETCH_COUNT', str(DEFAULT_PREFETCH_COUNT))),
+        receiver_count=int(os.getenv('SERVICE_BUS_RECEIVER_COUNT', '1'))
+    )
 
 def setup_signal_handlers():
     """
@@ -69,7 +102,7 @@ def setup_signal_handlers():
     """
     def signal_handler(signum, frame):
         signal_name = signal.Signals(signum).name
-        logger.info(f"Received {signal_name} signal, initiating graceful shutdown...")
+        logger.info("Received %s signal, initiating graceful shutdown...", signal_name)
         shutdown_event.set()
     
     # Handle SIGTERM (Docker/Kubernetes stop)
@@ -79,89 +112,168 @@ def setup_signal_handlers():
     
     logger.info("Signal handlers configured for graceful shutdown")
 
+def install_event_loop_policy():
+    """
+    Run the consumer on uvloop's libuv-based event loop when uvloop is installed.
+    uvloop is optional and not available on Windows; the default asyncio loop is used otherwise.
+    Returns True if uvloop was installed.
+    """
+    if sys.platform == "win32":
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop not installed, using the default asyncio event loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Using uvloop event loop")
+    return True
+
 async def safe_abandon_message(receiver, message):
     """
     Safely abandon a message with proper exception handling.
     Ensures the consumer continues working even if abandon fails.
+    The consumer passes a MessageSettler here, which only queues the message; the
+    settler logs whether the abandon actually succeeded.
     """
     try:
         await receiver.abandon_message(message)
-        logger.info("Message abandoned successfully")
+        logger.info("Message queued for abandon")
     except Exception as abandon_error:
-        logger.error(f"Failed to abandon message (this won't stop the consumer): {abandon_error}")
+        logger.error("Failed to abandon message (this won't stop the consumer): %s", abandon_error)
+
+async def abandon_messages(receiver, messages):
+    """
+    Abandon several messages at once.
+    The settle requests are issued concurrently so releasing a batch costs one
+    broker round trip instead of one per message.
+    """
+    await asyncio.gather(*(safe_abandon_message(receiver, message) for message in messages))
 
 async def safe_complete_message(receiver, message):
     """
     Safely complete a message with proper exception handling.
+    Workers pass a MessageSettler here, which only queues the message; the settler
+    logs whether the completion actually succeeded and abandons the message if it
+    did not. The except branch only matters for a receiver that settles directly.
     """
     try:
         await receiver.complete_message(message)
-        logger.info("Message completed successfully")
+        logger.info("Message queued for completion")
     except Exception as complete_error:
-        logger.error(f"Failed to complete message: {complete_error}")
+        logger.error("Failed to complete message: %s", complete_error)
         await safe_abandon_message(receiver, message)
 
-async def process_message_async(message, receiver, model_name, api_key, endpoint, api_version):
+class InvalidPayloadError(ValueError):
+    """Raised when a message body is not a valid essay evaluation payload."""
+
+def decode_payload(body_bytes):
+    """
+    Decode and validate a message body.
+    The expected shape is {"skills_list": [...], "essay": "..."}; anything else is
+    rejected here, before any AI call is made for it.
+    Raises orjson.JSONDecodeError for malformed JSON and InvalidPayloadError for
+    a well-formed body with the wrong shape.
+    """
+    payload = orjson.loads(body_bytes)
+    if not isinstance(payload, dict):
+        raise InvalidPayloadError("Payload must be a JSON object")
+
+    essay = payload.get("essay")
+    if not isinstance(essay, str) or not essay:
+        raise InvalidPayloadError("Payload field 'essay' must be a non-empty string")
+
+    if not isinstance(payload.get("skills_list", []), list):
+        raise InvalidPayloadError("Payload field 'skills_list' must be a list")
+
+    return payload
+
+def message_body_bytes(message):
+    """
+    Return a message body in a form orjson can decode without copying it where possible.
+    A bytes-like body is used as is; a sectioned body is only joined when it has more
+    than one section.
+    """
+    body = message.body
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return body
+    chunks = list(body)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+async def process_message_async(message, receiver, prompt_processor: "PromptProcessor"):
     try:
-        body_bytes = b"".join(message.body)
-        content = json.loads(body_bytes.decode('utf-8'))
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to decode JSON message: {e}")
+        content = decode_payload(message_body_bytes(message))
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to decode JSON message: %s", e)
+        await safe_abandon_message(receiver, message)
+        return
+    except InvalidPayloadError as e:
+        logger.error("Invalid message payload: %s", e)
         await safe_abandon_message(receiver, message)
         return
 
-    # Use context manager to ensure proper cleanup
     try:
-        async with PromptProcessor(model_name, api_key, endpoint, api_version) as prompt_processor:
-            result = await prompt_processor.process_payload(content)
-            logger.info(f"Evaluation result: {result}")
-            await safe_complete_message(receiver, message)
+        result = await prompt_processor.process_payload(content)
+        logger.info("Evaluation result: %s", result)
+        await safe_complete_message(receiver, message)
     except Exception as processing_error:
-        logger.error(f"Failed to process message: {processing_error}")
+        logger.error("Failed to process message: %s", processing_error)
         await safe_abandon_message(receiver, message)
 
-async def cleanup_completed_tasks(tasks):
+def next_backoff(current, maximum):
     """
-    Clean up completed tasks and handle their results/exceptions.
-    Returns the updated task set with completed tasks removed.
+    Return the next pause in an exponential backoff, capped at maximum.
     """
-    if not tasks:
-        return tasks
-    
-    # Get completed tasks without waiting
-    done, pending = await asyncio.wait(tasks, timeout=0, return_when=asyncio.ALL_COMPLETED)
-    
-    # Handle results/exceptions from completed tasks
-    for task in done:
-        try:
-            # This will raise an exception if the task failed
-            await task
-        except Exception as task_error:
-            logger.error(f"Task completed with error: {task_error}")
-    
-    return pending
+    return min(current * 2, maximum)
 
-async def wait_for_available_slot(tasks, max_concurrent_tasks):
+async def message_worker(queue, receiver, prompt_processor: "PromptProcessor"):
     """
-    Wait for at least one task to complete when we hit the concurrency limit.
-    Returns the updated task set with completed tasks cleaned up.
+    Process messages from the queue one at a time until a None sentinel arrives.
+    A fixed number of these workers bounds how many AI calls run concurrently,
+    and a full queue holds back the receive loop.
     """
-    if len(tasks) < max_concurrent_tasks:
-        return tasks
-    
-    # Wait for at least one task to complete
-    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-    
-    # Handle results/exceptions from completed tasks
-    for task in done:
+    while True:
+        message = await queue.get()
         try:
-            await task
-        except Exception as task_error:
-            logger.error(f"Task completed with error: {task_error}")
-    
-    return pending
+            if message is None:
+                return
+            await process_message_async(message, receiver, prompt_processor)
+        except Exception as worker_error:
+            logger.error("Worker failed to process message: %s", worker_error)
+        finally:
+            queue.task_done()
+
+def drain_queue(queue):
+    """
+    Remove and return every message still waiting in the worker queue.
+    """
+    queued_messages = []
+    while not queue.empty():
+        queued_messages.append(queue.get_nowait())
+        queue.task_done()
+    return queued_messages
+
+async def stop_workers(queue, workers, receiver, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+    """
+    Stop the worker pool during shutdown.
+    Messages still waiting in the queue are abandoned so they can be redelivered,
+    then each worker is sent a sentinel and given the timeout to finish the
+    message it is currently processing.
 
-async def graceful_shutdown_tasks(tasks, timeout=SHUTDOWN_TIMEOUT):
+    Returns:
+        bool: True if all workers finished gracefully, False if any were cancelled
+    """
+    queued_messages = drain_queue(queue)
+    if queued_messages:
+        logger.info("Abandoning %s queued messages", len(queued_messages))
+        await abandon_messages(receiver, queued_messages)
+
+    for _ in workers:
+        queue.put_nowait(None)
+
+    return await graceful_shutdown_tasks(set(workers), timeout=timeout)
+
+async def graceful_shutdown_tasks(tasks, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
     """
     Gracefully shutdown all running tasks within the specified timeout.
     
@@ -176,7 +288,7 @@ async def graceful_shutdown_tasks(tasks, timeout=SHUTDOWN_TIMEOUT):
         logger.info("No tasks to shutdown")
         return True
     
-    logger.info(f"Gracefully shutting down {len(tasks)} tasks (timeout: {timeout}s)")
+    logger.info("Gracefully shutting down %s tasks (timeout: %ss)", len(tasks), timeout)
     
     try:
         # Wait for all tasks to complete within timeout
@@ -188,11 +300,11 @@ async def graceful_shutdown_tasks(tasks, timeout=SHUTDOWN_TIMEOUT):
                 await task
                 logger.debug("Task completed successfully during shutdown")
             except Exception as task_error:
-                logger.warning(f"Task completed with error during shutdown: {task_error}")
+                logger.warning("Task completed with error during shutdown: %s", task_error)
         
         # Handle tasks that didn't complete in time
         if pending:
-            logger.warning(f"{len(pending)} tasks did not complete within {timeout}s, cancelling them")
+            logger.warning("%s tasks did not complete within %ss, cancelling them", len(pending), timeout)
             for task in pending:
                 task.cancel()
                 try:
@@ -200,127 +312,208 @@ async def graceful_shutdown_tasks(tasks, timeout=SHUTDOWN_TIMEOUT):
                 except asyncio.CancelledError:
                     logger.debug("Task cancelled successfully")
                 except Exception as task_error:
-                    logger.warning(f"Error during task cancellation: {task_error}")
+                    logger.warning("Error during task cancellation: %s", task_error)
             return False
         else:
             logger.info("All tasks completed gracefully")
             return True
             
     except Exception as shutdown_error:
-        logger.error(f"Error during graceful shutdown: {shutdown_error}")
+        logger.error("Error during graceful shutdown: %s", shutdown_error)
         return False
 
-async def run_service_bus_processor_async():
-    # Use validated environment variables
-    model_name = env_vars['AI_MODEL_NAME']
-    api_key = env_vars['AI_API_KEY']
-    endpoint = env_vars['AI_ENDPOINT']
-    api_version = env_vars['API_VERSION']
-    
+class ReceiverLogAdapter(logging.LoggerAdapter):
+    """
+    Prefixes log messages with the receiver they came from, so each receiver's
+    activity can be told apart when several run side by side.
+    """
+    def process(self, msg, kwargs):
+        return f"[receiver {self.extra['receiver']}] {msg}", kwargs
+
+async def run_receiver_async(config: ConsumerConfig, prompt_processor: "PromptProcessor", transport_type,
+                             worker_count: int, receiver_logger: logging.LoggerAdapter):
+    """
+    Run one Service Bus client and queue receiver with its own worker pool,
+    reconnecting on connection failures until shutdown.
+    """
+    from azure.servicebus.aio import ServiceBusClient as AsyncServiceBusClient
+
     retry_count = 0
     max_retries = 3
-    max_concurrent_tasks = 10
-    
-    logger.info(f"Starting Service Bus processor with model: {model_name}")
-    logger.info(f"Graceful shutdown timeout: {SHUTDOWN_TIMEOUT}s")
-    
+
     while retry_count <= max_retries and not shutdown_event.is_set():
         try:
-            async with AsyncServiceBusClient.from_connection_string(SERVICE_BUS_CONNECTION_STR) as client:
-                receiver = client.get_queue_receiver(queue_name=QUEUE_NAME)
+            async with AsyncServiceBusClient.from_connection_string(
+                config.service_bus_connection_str,
+                retry_total=config.retry_total,
+                retry_backoff_factor=SERVICE_BUS_RETRY_BACKOFF_FACTOR,
+                retry_backoff_max=SERVICE_BUS_RETRY_BACKOFF_MAX,
+                transport_type=transport_type
+            ) as client:
+                receiver = client.get_queue_receiver(queue_name=config.queue_name, prefetch_count=config.prefetch_count)
                 async with receiver:
-                    logger.info("Service Bus consumer started successfully (async)")
+                    receiver_logger.info("Service Bus consumer started successfully (async)")
                     retry_count = 0
-                    tasks = set()
-                    
-                    while not shutdown_event.is_set():
-                        try:
-                            messages = await receiver.receive_messages(max_message_count=BATCH_SIZE, max_wait_time=5)
-                            if not messages:
-                                await asyncio.sleep(2)
-                                # Clean up any completed tasks during idle time
-                                tasks = await cleanup_completed_tasks(tasks)
-                                continue
-                            
-                            # Check for shutdown signal before processing new messages
-                            if shutdown_event.is_set():
-                                logger.info("Shutdown signal received, stopping message processing")
-                                # Abandon all unprocessed messages
-                                for msg in messages:
-                                    await safe_abandon_message(receiver, msg)
-                                break
-                            
-                            for msg in messages:
-                                # Check shutdown signal before processing each message
-                                if shutdown_event.is_set():
-                                    logger.info("Shutdown signal received, abandoning remaining messages")
-                                    await safe_abandon_message(receiver, msg)
+
+                    # Workers settle through a batching settler rather than the receiver
+                    settler = MessageSettler(receiver, max_batch_size=BATCH_SIZE)
+                    settler.start()
+
+                    # Received messages are queued for a fixed pool of workers; the
+                    # bounded queue pauses receiving while the workers are busy
+                    queue = asyncio.Queue(maxsize=worker_count * 2)
+                    workers = [
+                        asyncio.create_task(message_worker(queue, settler, prompt_processor))
+                        for _ in range(worker_count)
+                    ]
+                
+                    try:
+                        error_backoff = ERROR_BACKOFF_MIN
+
+                        while not shutdown_event.is_set():
+                            try:
+                                messages = await receiver.receive_messages(max_message_count=BATCH_SIZE, max_wait_time=RECEIVE_MAX_WAIT_TIME)
+                                error_backoff = ERROR_BACKOFF_MIN
+                                if not messages:
                                     continue
-                                
-                                # Wait for available slot if we're at the limit
-                                tasks = await wait_for_available_slot(tasks, max_concurrent_tasks)
-                                
-                                # Create new task for message processing
-                                task = asyncio.create_task(
-                                    process_message_async(msg, receiver, model_name, api_key, endpoint, api_version)
-                                )
-                                tasks.add(task)
-                            
-                            # Clean up completed tasks after processing batch
-                            tasks = await cleanup_completed_tasks(tasks)
+                        
+                                # Check for shutdown signal before processing new messages
+                                if shutdown_event.is_set():
+                                    receiver_logger.info("Shutdown signal received, stopping message processing")
+                                    # Abandon all unprocessed messages
+                                    await abandon_messages(settler, messages)
+                                    break
+                        
+                                for index, msg in enumerate(messages):
+                                    # Check shutdown signal before processing each message
+                                    if shutdown_event.is_set():
+                                        receiver_logger.info("Shutdown signal received, abandoning remaining messages")
+                                        await abandon_messages(settler, messages[index:])
+                                        break
                             
-                        except Exception as receive_error:
-                            if shutdown_event.is_set():
-                                logger.info("Shutdown in progress, skipping error recovery")
-                                break
-                            logger.error(f"Error receiving messages: {receive_error}")
-                            await asyncio.sleep(5)
-                            # Clean up tasks during error recovery
-                            tasks = await cleanup_completed_tasks(tasks)
-                    
-                    # Graceful shutdown of remaining tasks
-                    if tasks:
-                        logger.info("Initiating graceful shutdown of in-flight tasks")
-                        graceful_complete = await graceful_shutdown_tasks(tasks)
+                                    # Waits for room in the queue if the workers are behind
+                                    await queue.put(msg)
+                        
+                            except Exception as receive_error:
+                                if shutdown_event.is_set():
+                                    receiver_logger.info("Shutdown in progress, skipping error recovery")
+                                    break
+                                receiver_logger.error("Error receiving messages: %s", receive_error)
+                                await asyncio.sleep(error_backoff)
+                                error_backoff = next_backoff(error_backoff, ERROR_BACKOFF_MAX)
+                
+                        # Graceful shutdown of the worker pool
+                        receiver_logger.info("Initiating graceful shutdown of in-flight tasks")
+                        graceful_complete = await stop_workers(queue, workers, settler, timeout=config.shutdown_timeout)
                         if graceful_complete:
-                            logger.info("All in-flight tasks completed successfully")
+                            receiver_logger.info("All in-flight tasks completed successfully")
                         else:
-                            logger.warning("Some tasks were forcefully cancelled during shutdown")
-                    
-                    logger.info("Service Bus consumer shutdown completed")
-                    return  # Exit the retry loop on graceful shutdown
-                    
+                            receiver_logger.warning("Some tasks were forcefully cancelled during shutdown")
+
+                        # Settle whatever the workers finished before the receiver closes
+                        await settler.close()
+                
+                        receiver_logger.info("Service Bus consumer shutdown completed")
+                        return  # Exit the retry loop on graceful shutdown
+                    except asyncio.CancelledError:
+                        # Cancelled because a sibling receiver failed; release the queued
+                        # messages and stop this receiver's workers before the shared
+                        # PromptProcessor is cleaned up
+                        queued_messages = drain_queue(queue)
+                        if queued_messages:
+                            receiver_logger.info("Abandoning %s queued messages", len(queued_messages))
+                            await abandon_messages(settler, queued_messages)
+                        for worker in workers:
+                            worker.cancel()
+                        await asyncio.gather(*workers, return_exceptions=True)
+                        await settler.close()
+                        raise
+                
         except Exception as connection_error:
             if shutdown_event.is_set():
-                logger.info("Shutdown signal received during connection error, stopping retries")
+                receiver_logger.info("Shutdown signal received during connection error, stopping retries")
                 break
-                
+            
             retry_count += 1
-            logger.error(f"Service Bus connection failed (attempt {retry_count}/{max_retries + 1}): {connection_error}")
+            receiver_logger.error("Service Bus connection failed (attempt %s/%s): %s", retry_count, max_retries + 1, connection_error)
             if retry_count <= max_retries:
                 wait_time = min(30, 2 ** retry_count)
-                logger.info(f"Retrying connection in {wait_time} seconds...")
-                
-                # Wait with shutdown check
-                for _ in range(wait_time):
-                    if shutdown_event.is_set():
-                        logger.info("Shutdown signal received during retry wait, aborting")
-                        return
-                    await asyncio.sleep(1)
+                receiver_logger.info("Retrying connection in %s seconds...", wait_time)
+            
+                # Wait for the backoff, waking early only if shutdown is requested
+                try:
+                    await asyncio.wait_for(shutdown_event.wait(), timeout=wait_time)
+                    receiver_logger.info("Shutdown signal received during retry wait, aborting")
+                    return
+                except asyncio.TimeoutError:
+                    pass
             else:
-                logger.critical("Max retries exceeded. Service Bus consumer stopping.")
+                receiver_logger.critical("Max retries exceeded. Service Bus consumer stopping.")
                 raise
 
+async def run_service_bus_processor_async(config: ConsumerConfig):
+    from azure.servicebus import TransportType
+    from prompt_processor import PromptProcessor
+    from blob_client import AzureBlobTemplateClient
+
+    max_concurrent_tasks = 10  # Number of message workers, shared out between the receivers
+    # Every receiver needs at least one worker, so more receivers than workers would exceed the limit
+    receiver_count = min(max(1, config.receiver_count), max_concurrent_tasks)
+    if receiver_count < config.receiver_count:
+        logger.warning("SERVICE_BUS_RECEIVER_COUNT %s exceeds the %s workers, using %s receivers",
+                       config.receiver_count, max_concurrent_tasks, receiver_count)
+    # The first receivers take one extra worker each when the workers do not divide evenly
+    workers_per_receiver, extra_workers = divmod(max_concurrent_tasks, receiver_count)
+    
+    logger.info("Starting Service Bus processor with model: %s", config.ai.model_name)
+    logger.info("Graceful shutdown timeout: %ss", config.shutdown_timeout)
+    logger.info("Running %s receiver(s) sharing %s workers", receiver_count, max_concurrent_tasks)
+
+    # AMQP over websockets (port 443) is for networks that block the AMQP port
+    transport_type = TransportType.AmqpOverWebsocket if config.use_websockets else TransportType.Amqp
+
+    # One PromptProcessor serves every receiver and survives reconnects, keeping the
+    # kernel, AI client and template client (with its connection pool) warm
+    prompt_processor = PromptProcessor.from_config(config.ai, blob_client=AzureBlobTemplateClient())
+    logger.info("Shared PromptProcessor created")
+    
+    async with prompt_processor:
+        # Each receiver has its own client and AMQP link, so links are not a throughput cap
+        receivers = [
+            asyncio.create_task(run_receiver_async(
+                config,
+                prompt_processor,
+                transport_type,
+                workers_per_receiver + (1 if index < extra_workers else 0),
+                ReceiverLogAdapter(logger, {"receiver": index})
+            ))
+            for index in range(receiver_count)
+        ]
+        try:
+            await asyncio.gather(*receivers)
+        except BaseException:
+            # A receiver that gives up must not leave the others running against the
+            # PromptProcessor that is cleaned up when this block exits
+            for task in receivers:
+                task.cancel()
+            await asyncio.gather(*receivers, return_exceptions=True)
+            raise
+
 def run_service_bus_processor():
     # Setup signal handlers before starting
     setup_signal_handlers()
     
     try:
-        asyncio.run(run_service_bus_processor_async())
+        # Read .env and validate only when the consumer actually starts, so
+        # importing this module has no filesystem or environment side effects
+        dotenv.load_dotenv()
+        config = validate_environment_variables()
+        install_event_loop_policy()
+        asyncio.run(run_service_bus_processor_async(config))
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received")
     except Exception as e:
-        logger.error(f"Application error: {e}")
+        logger.error("Application error: %s", e)
         sys.exit(1)
     finally:
         logger.info("Service Bus consumer stopped")
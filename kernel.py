@@ -6,14 +6,8 @@ from azure.core.credentials import AzureKeyCredential
 import logging
 from enum import Enum
 
-# Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
 class ProviderType(Enum):
     AZURE_OPENAI = "azure_openai"
@@ -32,7 +26,7 @@ class KernelFactory:
                 endpoint=endpoint
             )
             kernel.add_service(chat_completion)
-            logger.info(f"Created kernel with Azure OpenAI provider: {deployment_name}")
+            logger.info("Created kernel with Azure OpenAI provider: %s", deployment_name)
             
         elif provider_type == ProviderType.AZURE_AI_INFERENCE:
             # chat_completion_client = ChatCompletionsClient(
@@ -46,7 +40,7 @@ class KernelFactory:
                 endpoint=endpoint
             )
             kernel.add_service(chat_completion_service)
-            logger.info(f"Created kernel with Azure AI Inference provider: {deployment_name}")
+            logger.info("Created kernel with Azure AI Inference provider: %s", deployment_name)
             
         else:
             raise ValueError(f"Unsupported provider type: {provider_type}")
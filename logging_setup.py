@@ -0,0 +1,24 @@
+import logging
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_configured = False
+
+def configure_logging():
+    """
+    Attach a single console handler to the root logger.
+    Application modules only create their own logger and set it to INFO; their
+    records propagate here, so each line is formatted and written exactly once.
+    Third-party loggers keep the root WARNING level. Calling this more than once
+    has no effect.
+    """
+    global _configured
+    if _configured:
+        return
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(console_handler)
+    _configured = True
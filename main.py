@@ -1,14 +1,10 @@
 import logging
+from logging_setup import configure_logging
 from consumer import run_service_bus_processor
 
-# Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
 if __name__ == "__main__":
+    configure_logging()
     run_service_bus_processor()
@@ -1,6 +1,6 @@
 from semantic_kernel.functions import kernel_function
 from typing import Annotated
-import json
+import orjson
 
 class PostEvaluation:
     def _evaluate_skill_score(self, skill: dict) -> int:
@@ -8,6 +8,9 @@ class PostEvaluation:
         Retorna o score da skill, tratando valores não numéricos como 0.
         """
         score = skill.get("nota", 0)
+        # Integer scores need no conversion; only other types go through int()
+        if type(score) is int:
+            return score
         try:
             return int(score)
         except (ValueError, TypeError):
@@ -30,35 +33,33 @@ class PostEvaluation:
         try:
             # Parse skills if it's a JSON string
             if isinstance(skills_result_list, str):
-                skills = json.loads(skills_result_list)
+                skills = orjson.loads(skills_result_list)
             else:
                 skills = skills_result_list
 
             if not skills:
-                return json.dumps({"error": "No skills provided for evaluation."})
+                return orjson.dumps({"error": "No skills provided for evaluation."}).decode()
 
-            scores = []
+            # Single pass; any zero score fails the essay, so stop at the first one
+            total = 0
+            count = 0
             for skill in skills:
                 score = self._evaluate_skill_score(skill)
-                scores.append(score)
+                if score == 0:
+                    return orjson.dumps({"result": "reprovado", "avg_score": 0}).decode()
+                total += score
+                count += 1
 
-            if not scores:
-                return json.dumps({"error": "No scores calculated."})
+            if not count:
+                return orjson.dumps({"error": "No scores calculated."}).decode()
 
-            if any(score == 0 for score in scores):
-                result = "reprovado"
-                avg_score = 0
-            else:
-                avg_score = sum(scores) / len(scores)
-                if avg_score >= 7:
-                    result = "aprovado"
-                else:
-                    result = "reprovado"
+            avg_score = total / count
+            result = "aprovado" if avg_score >= 7 else "reprovado"
 
-            return json.dumps({
+            return orjson.dumps({
                 "result": result,
                 "avg_score": avg_score
-            })
+            }).decode()
 
         except Exception as e:
-            return json.dumps({"error": f"Evaluation failed: {str(e)}"})
+            return orjson.dumps({"error": f"Evaluation failed: {str(e)}"}).decode()
@@ -1,27 +1,25 @@
 import os
 import yaml
 import logging
-import json
 import gc
 import asyncio
+import orjson
 from semantic_kernel.functions import KernelArguments
 from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from kernel import ProviderType, KernelFactory
 from blob_client import AzureBlobTemplateClient
+from ai_config import AIConfig
 from post_evaluation import PostEvaluation
 
-# Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+
+# libyaml-backed loader when PyYAML was built with it, pure-Python otherwise
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 class PromptProcessor:
-    def __init__(self, deployment_name: str, api_key: str, endpoint: str = None, api_version: str = None, provider_type: str = "azure_openai"):
+    def __init__(self, deployment_name: str, api_key: str, endpoint: str = None, api_version: str = None, provider_type: str = "azure_openai", blob_client: AzureBlobTemplateClient = None):
         # Create kernel directly without complex provider injection
         self.kernel = KernelFactory.create_kernel(
             ProviderType["AZURE_AI_INFERENCE"],
@@ -31,9 +29,32 @@ class PromptProcessor:
             api_version=api_version
         )
         
+        # Template client can be injected so its connection pool is shared; otherwise it is
+        # created on first use. It caches the template and refreshes it after its TTL.
+        self._blob_client = blob_client
+
+        # Semantic function registered for the template text it was built from; only
+        # re-registered when the template blob changes
+        self._function = None
+        self._function_template = None
+
+        # Execution settings are the same for every essay, so they are built once
+        self._execution_settings = PromptExecutionSettings(function_choice_behavior=FunctionChoiceBehavior.Auto())
+
         # Register the PostEvaluation plugin
         self._register_plugins()
 
+    @classmethod
+    def from_config(cls, config: AIConfig, blob_client: AzureBlobTemplateClient = None) -> "PromptProcessor":
+        """Create a processor for the deployment described by an AIConfig."""
+        return cls(
+            config.model_name,
+            config.api_key,
+            endpoint=config.endpoint,
+            api_version=config.api_version,
+            blob_client=blob_client
+        )
+
     def _register_plugins(self):
         """Register all plugins that can be called from prompts."""
         self.kernel.add_plugin(
@@ -41,36 +62,46 @@ class PromptProcessor:
         )
         logger.info("PostEvaluation plugin registered successfully")
 
+    def _get_function(self, yaml_content: str):
+        """
+        Return the evaluation function for a template, registering it with the kernel only
+        the first time and whenever the template content changes.
+        """
+        if self._function is not None and yaml_content == self._function_template:
+            return self._function
+
+        # Fail fast on a malformed template before registering it
+        yaml.load(yaml_content, Loader=_YAML_LOADER)
+
+        self._function = self.kernel.add_function(
+            function_name="evaluate_essay",
+            plugin_name="evaluate_essay",
+            prompt=yaml_content,
+            template_format="handlebars"
+        )
+        self._function_template = yaml_content
+        logger.info("Evaluation function registered from template")
+        return self._function
+
     async def process_payload(self, payload) -> str:
         # payload is now a JSON object (dict or str)
         if isinstance(payload, str):
-            payload = json.loads(payload)
+            payload = orjson.loads(payload)
         
         skills_list = payload.get("skills_list", [])
         essay = payload.get("essay", "")
         
-        # Fetch template from Azure Blob Storage
-        blob_client = AzureBlobTemplateClient()
-        yaml_content = blob_client.get_template()
-        
-        # Parse the YAML to get the template and execution settings
-        template_config = yaml.safe_load(yaml_content)
-        template_text = template_config["template"]
-
-        
-        # Create function directly from template text
-        semantic_function = self.kernel.add_function(
-            function_name="evaluate_essay",
-            plugin_name="evaluate_essay",
-            prompt=yaml_content,
-            template_format="handlebars"
-        )
+        # Fetch template from Azure Blob Storage (served from the client's TTL cache)
+        if self._blob_client is None:
+            self._blob_client = AzureBlobTemplateClient()
+        yaml_content = self._blob_client.get_template()
+        semantic_function = self._get_function(yaml_content)
 
         # Convert skills_list to JSON string for the function call
-        skills_json = json.dumps(skills_list) if isinstance(skills_list, list) else str(skills_list)
+        skills_json = orjson.dumps(skills_list).decode() if isinstance(skills_list, list) else str(skills_list)
         
         arguments = KernelArguments(
-            settings=PromptExecutionSettings(function_choice_behavior=FunctionChoiceBehavior.Auto()),
+            settings=self._execution_settings,
             skills_list=skills_json,
             essay=essay
         )
@@ -83,6 +114,10 @@ class PromptProcessor:
         Clean up resources by forcing cleanup of aiohttp sessions.
         This approach doesn't rely on internal Kernel APIs.
         """
+        if self._blob_client is not None:
+            self._blob_client.close()
+            self._blob_client = None
+
         try:
             # Import here to avoid import issues if aiohttp isn't available
             import aiohttp
@@ -96,7 +131,7 @@ class PromptProcessor:
                             await obj.close()
                             logger.debug("Closed unclosed aiohttp ClientSession")
                         except Exception as e:
-                            logger.debug(f"Error closing aiohttp session: {e}")
+                            logger.debug("Error closing aiohttp session: %s", e)
             
             # Clear kernel reference and force garbage collection
             self.kernel = None
@@ -110,9 +145,24 @@ class PromptProcessor:
             gc.collect()
             logger.debug("PromptProcessor cleanup completed (no aiohttp cleanup)")
         except Exception as cleanup_error:
-            logger.warning(f"Error during PromptProcessor cleanup: {cleanup_error}")
+            logger.warning("Error during PromptProcessor cleanup: %s", cleanup_error)
+
+    async def preload_template(self):
+        """
+        Download the template into the client's cache on a worker thread, so the first
+        messages are served from memory instead of blocking the event loop on the download.
+        A failure is only logged; process_payload fetches the template again when needed.
+        """
+        if self._blob_client is None:
+            return
+        try:
+            await asyncio.to_thread(self._blob_client.get_template)
+            logger.info("Prompt template preloaded")
+        except Exception as e:
+            logger.warning("Could not preload prompt template: %s", e)
 
     async def __aenter__(self):
+        await self.preload_template()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
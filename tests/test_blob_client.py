@@ -1,75 +1,102 @@
 import pytest
-import os
-from unittest.mock import Mock, patch, MagicMock
-from azure.core.exceptions import ResourceNotFoundError, AzureError
-from azure.storage.blob import BlobServiceClient
-import sys
-
-# Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from unittest.mock import Mock, patch, ANY, call
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError, AzureError
+from azure.core import MatchConditions
+from types import SimpleNamespace
 
+import blob_client
 from blob_client import AzureBlobTemplateClient
 
 
+class InlineThread:
+    """Stand-in for threading.Thread that runs its target on start() so background refreshes are deterministic."""
+
+    def __init__(self, target=None, args=(), kwargs=None, **_):
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs or {}
+
+    def start(self):
+        self._target(*self._args, **self._kwargs)
+
+
+# Environment variables read by AzureBlobTemplateClient
+CLIENT_ENV_VARS = [
+    'AZURE_STORAGE_CONNECTION_STRING',
+    'AZURE_STORAGE_ACCOUNT_URL',
+    'PROMPT_TEMPLATE_CONTAINER_NAME',
+    'PROMPT_TEMPLATE_BLOB_NAME',
+    'PROMPT_TEMPLATE_TTL_SECONDS',
+    'AZURE_TOKEN_CACHE_PERSISTENCE',
+    'AZURE_TOKEN_CACHE_NAME',
+    'AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED',
+    'PROMPT_TEMPLATE_DOWNLOAD_CONCURRENCY'
+]
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    """Start each test without the client's environment variables or a cached credential; monkeypatch restores both afterwards."""
+    for var in CLIENT_ENV_VARS:
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setattr(blob_client, '_shared_credential', None)
+
+
+@pytest.fixture
+def blob_mocks(monkeypatch):
+    """Connection-string client setup with the service -> container -> blob -> download chain mocked."""
+    monkeypatch.setenv('AZURE_STORAGE_CONNECTION_STRING', 'fake_connection_string')
+    with patch('blob_client.BlobServiceClient.from_connection_string') as mock_from_connection_string:
+        mocks = SimpleNamespace(
+            from_connection_string=mock_from_connection_string,
+            service=Mock(),
+            container=Mock(),
+            blob=Mock(),
+            download=Mock()
+        )
+        mock_from_connection_string.return_value = mocks.service
+        mocks.service.get_container_client.return_value = mocks.container
+        mocks.container.get_blob_client.return_value = mocks.blob
+        mocks.blob.download_blob.return_value = mocks.download
+        yield mocks
+
+
 class TestAzureBlobTemplateClient:
     """Test suite for AzureBlobTemplateClient class."""
 
-    def setup_method(self):
-        """Set up test fixtures before each test method."""
-        # Clear environment variables to ensure clean state
-        env_vars_to_clear = [
-            'AZURE_STORAGE_CONNECTION_STRING',
-            'AZURE_STORAGE_ACCOUNT_URL',
-            'PROMPT_TEMPLATE_CONTAINER_NAME',
-            'PROMPT_TEMPLATE_BLOB_NAME'
-        ]
-        for var in env_vars_to_clear:
-            if var in os.environ:
-                del os.environ[var]
-
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_init_with_connection_string_and_container_name(self, mock_from_connection_string):
+    def test_init_with_connection_string_and_container_name(self, blob_mocks):
         """Test initialization with connection string and explicit container name."""
-        # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_from_connection_string.return_value = mock_blob_service
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
-        
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
         
         # Verify
-        mock_from_connection_string.assert_called_once_with('fake_connection_string')
-        assert client.blob_service_client == mock_blob_service
-        mock_blob_service.get_container_client.assert_called_once_with('test-container')
+        blob_mocks.from_connection_string.assert_called_once_with('fake_connection_string', transport=ANY)
+        assert client.blob_service_client == blob_mocks.service
+        blob_mocks.service.get_container_client.assert_called_once_with('test-container')
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_init_with_connection_string_and_env_container(self, mock_from_connection_string):
+    def test_init_with_connection_string_and_env_container(self, blob_mocks, monkeypatch):
         """Test initialization with connection string and container name from environment."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_from_connection_string.return_value = mock_blob_service
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
-        os.environ['PROMPT_TEMPLATE_CONTAINER_NAME'] = 'env-container'
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'env-container')
         
         # Execute
         client = AzureBlobTemplateClient()
         
         # Verify
-        mock_from_connection_string.assert_called_once_with('fake_connection_string')
-        mock_blob_service.get_container_client.assert_called_once_with('env-container')
+        blob_mocks.from_connection_string.assert_called_once_with('fake_connection_string', transport=ANY)
+        blob_mocks.service.get_container_client.assert_called_once_with('env-container')
 
     @patch('blob_client.DefaultAzureCredential')
     @patch('blob_client.BlobServiceClient')
-    def test_init_with_managed_identity(self, mock_blob_service_client, mock_default_credential):
+    def test_init_with_managed_identity(self, mock_blob_service_client, mock_default_credential, monkeypatch):
         """Test initialization with managed identity (DefaultAzureCredential)."""
         # Setup
         mock_credential = Mock()
         mock_default_credential.return_value = mock_credential
-        mock_blob_service = Mock(spec=BlobServiceClient)
+        mock_blob_service = Mock()
         mock_blob_service_client.return_value = mock_blob_service
-        os.environ['AZURE_STORAGE_ACCOUNT_URL'] = 'https://test.blob.core.windows.net'
-        os.environ['PROMPT_TEMPLATE_CONTAINER_NAME'] = 'test-container'
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
         
         # Execute
         client = AzureBlobTemplateClient()
@@ -78,10 +105,80 @@ class TestAzureBlobTemplateClient:
         mock_default_credential.assert_called_once()
         mock_blob_service_client.assert_called_once_with(
             account_url='https://test.blob.core.windows.net',
-            credential=mock_credential
+            credential=mock_credential,
+            transport=ANY
         )
         mock_blob_service.get_container_client.assert_called_once_with('test-container')
 
+    @patch('blob_client.DefaultAzureCredential')
+    @patch('blob_client.BlobServiceClient')
+    def test_init_managed_identity_reuses_credential(self, mock_blob_service_client, mock_default_credential, monkeypatch):
+        """Test that multiple clients share a single DefaultAzureCredential instance."""
+        # Setup
+        mock_credential = Mock()
+        mock_default_credential.return_value = mock_credential
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
+        
+        # Execute
+        AzureBlobTemplateClient()
+        AzureBlobTemplateClient()
+        
+        # Verify
+        mock_default_credential.assert_called_once()
+        for call_args in mock_blob_service_client.call_args_list:
+            assert call_args.kwargs['credential'] is mock_credential
+
+    @patch('blob_client.TokenCachePersistenceOptions')
+    @patch('blob_client.DefaultAzureCredential')
+    @patch('blob_client.BlobServiceClient')
+    def test_init_managed_identity_persistent_token_cache(self, mock_blob_service_client, mock_default_credential, mock_cache_options, monkeypatch):
+        """Test that the persistent token cache is enabled when requested via environment."""
+        # Setup
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
+        monkeypatch.setenv('AZURE_TOKEN_CACHE_PERSISTENCE', 'true')
+        monkeypatch.setenv('AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED', 'true')
+        
+        # Execute
+        AzureBlobTemplateClient()
+        
+        # Verify
+        mock_cache_options.assert_called_once_with(name='sk-consumer', allow_unencrypted_storage=True)
+        mock_default_credential.assert_called_once_with(cache_persistence_options=mock_cache_options.return_value)
+
+    @patch('blob_client.TokenCachePersistenceOptions')
+    @patch('blob_client.DefaultAzureCredential')
+    @patch('blob_client.BlobServiceClient')
+    def test_init_managed_identity_no_persistent_cache_by_default(self, mock_blob_service_client, mock_default_credential, mock_cache_options, monkeypatch):
+        """Test that tokens are not persisted to disk unless explicitly enabled."""
+        # Setup
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
+        
+        # Execute
+        AzureBlobTemplateClient()
+        
+        # Verify
+        mock_cache_options.assert_not_called()
+        mock_default_credential.assert_called_once_with()
+
+    @patch('blob_client.DefaultAzureCredential')
+    @patch('blob_client.BlobServiceClient')
+    def test_init_persistent_token_cache_unavailable(self, mock_blob_service_client, mock_default_credential, monkeypatch):
+        """Test an azure-identity without persistent caching falls back to the in-memory cache."""
+        # Setup - the state blob_client is left in when only TokenCachePersistenceOptions fails to import
+        monkeypatch.setattr(blob_client, 'TokenCachePersistenceOptions', None)
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
+        monkeypatch.setenv('AZURE_TOKEN_CACHE_PERSISTENCE', 'true')
+        
+        # Execute
+        AzureBlobTemplateClient()
+        
+        # Verify
+        mock_default_credential.assert_called_once_with()
+
     def test_init_no_container_name_raises_error(self):
         """Test that initialization without container name raises ValueError."""
         # Setup - no environment variables set
@@ -90,34 +187,22 @@ class TestAzureBlobTemplateClient:
         with pytest.raises(ValueError, match="Container name must be provided"):
             AzureBlobTemplateClient()
 
-    @patch('blob_client.DefaultAzureCredential')
-    def test_init_managed_identity_import_error(self, mock_default_credential):
-        """Test initialization handles import error for DefaultAzureCredential."""
-        # Setup
-        mock_default_credential.side_effect = ImportError("azure-identity not installed")
-        os.environ['AZURE_STORAGE_ACCOUNT_URL'] = 'https://test.blob.core.windows.net'
-        os.environ['PROMPT_TEMPLATE_CONTAINER_NAME'] = 'test-container'
+    def test_init_managed_identity_import_error(self, monkeypatch):
+        """Test initialization raises ImportError when azure-identity is not installed."""
+        # Setup - the state blob_client is left in when importing azure.identity fails
+        monkeypatch.setattr(blob_client, '_default_credential_available', False)
+        monkeypatch.setattr(blob_client, 'DefaultAzureCredential', None)
+        monkeypatch.setenv('AZURE_STORAGE_ACCOUNT_URL', 'https://test.blob.core.windows.net')
+        monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'test-container')
         
         # Execute & Verify
-        with pytest.raises(ImportError):
+        with pytest.raises(ImportError, match="azure-identity package is required"):
             AzureBlobTemplateClient()
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_success_with_blob_name(self, mock_from_connection_string):
+    def test_get_template_success_with_blob_name(self, blob_mocks):
         """Test successful template retrieval with explicit blob name."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
-        mock_download_result = Mock()
-        
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.return_value = mock_download_result
-        mock_download_result.content_as_text.return_value = "test template content"
-        
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+        blob_mocks.download.content_as_text.return_value = "test template content"
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
@@ -125,27 +210,17 @@ class TestAzureBlobTemplateClient:
         
         # Verify
         assert result == "test template content"
-        mock_container_client.get_blob_client.assert_called_once_with('test-template.yaml')
-        mock_blob_client.download_blob.assert_called_once()
-        mock_download_result.content_as_text.assert_called_once_with(encoding='utf-8')
+        assert blob_mocks.container.mock_calls == [
+            call.get_blob_client('test-template.yaml'),
+            call.get_blob_client().download_blob(max_concurrency=4),
+            call.get_blob_client().download_blob().content_as_text(encoding='utf-8')
+        ]
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_success_with_env_blob_name(self, mock_from_connection_string):
+    def test_get_template_success_with_env_blob_name(self, blob_mocks, monkeypatch):
         """Test successful template retrieval with blob name from environment."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
-        mock_download_result = Mock()
-        
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.return_value = mock_download_result
-        mock_download_result.content_as_text.return_value = "env template content"
-        
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
-        os.environ['PROMPT_TEMPLATE_BLOB_NAME'] = 'env-template.yaml'
+        blob_mocks.download.content_as_text.return_value = "env template content"
+        monkeypatch.setenv('PROMPT_TEMPLATE_BLOB_NAME', 'env-template.yaml')
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
@@ -153,16 +228,10 @@ class TestAzureBlobTemplateClient:
         
         # Verify
         assert result == "env template content"
-        mock_container_client.get_blob_client.assert_called_once_with('env-template.yaml')
+        blob_mocks.container.get_blob_client.assert_called_once_with('env-template.yaml')
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_no_blob_name_raises_error(self, mock_from_connection_string):
+    def test_get_template_no_blob_name_raises_error(self, blob_mocks):
         """Test that get_template without blob name raises ValueError."""
-        # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_from_connection_string.return_value = mock_blob_service
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
-        
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
         
@@ -170,106 +239,189 @@ class TestAzureBlobTemplateClient:
         with pytest.raises(ValueError, match="Template blob name must be provided"):
             client.get_template()
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_blob_not_found(self, mock_from_connection_string):
-        """Test handling of ResourceNotFoundError when blob doesn't exist."""
+    @pytest.mark.parametrize("download_error,expected_error,match", [
+        (ResourceNotFoundError("Blob not found"), FileNotFoundError, "Template blob 'test.yaml' not found"),
+        (AzureError("Azure service error"), AzureError, "Azure service error"),
+        (RuntimeError("Unexpected error"), RuntimeError, "Unexpected error"),
+    ])
+    def test_get_template_download_errors(self, download_error, expected_error, match, blob_mocks):
+        """Test that download failures surface as the expected exception."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
+        blob_mocks.blob.download_blob.side_effect = download_error
         
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.side_effect = ResourceNotFoundError("Blob not found")
+        # Execute
+        client = AzureBlobTemplateClient(container_name='test-container')
         
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+        # Verify
+        with pytest.raises(expected_error, match=match):
+            client.get_template(blob_name='test.yaml')
+
+    def test_get_template_encoding_handling(self, blob_mocks):
+        """Test that the template is correctly decoded with UTF-8 encoding."""
+        # Setup
+        blob_mocks.download.content_as_text.return_value = "UTF-8 content with special chars: ñáéíóú"
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
+        result = client.get_template(blob_name='utf8-template.yaml')
         
         # Verify
-        with pytest.raises(FileNotFoundError, match="Template blob 'missing.yaml' not found"):
-            client.get_template(blob_name='missing.yaml')
+        assert result == "UTF-8 content with special chars: ñáéíóú"
+        blob_mocks.download.content_as_text.assert_called_once_with(encoding='utf-8')
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_azure_error(self, mock_from_connection_string):
-        """Test handling of general AzureError during blob download."""
+    @patch('blob_client.time.monotonic')
+    def test_get_template_cached_within_ttl(self, mock_monotonic, blob_mocks, monkeypatch):
+        """Test that a cached template is returned without downloading while the TTL is valid."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
+        blob_mocks.download.content_as_text.return_value = "cached template"
+        mock_monotonic.side_effect = [100.0, 150.0]
+        monkeypatch.setenv('PROMPT_TEMPLATE_TTL_SECONDS', '60')
         
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.side_effect = AzureError("Azure service error")
+        # Execute
+        client = AzureBlobTemplateClient(container_name='test-container')
+        first = client.get_template(blob_name='test.yaml')
+        second = client.get_template(blob_name='test.yaml')
         
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+        # Verify
+        assert first == second == "cached template"
+        blob_mocks.blob.download_blob.assert_called_once_with(max_concurrency=4)
+
+    @patch('blob_client.threading.Thread', InlineThread)
+    @patch('blob_client.time.monotonic')
+    def test_get_template_revalidates_after_ttl_not_modified(self, mock_monotonic, blob_mocks, monkeypatch):
+        """Test that an expired entry is revalidated by ETag and kept when the blob is unchanged."""
+        # Setup
+        blob_mocks.download.content_as_text.return_value = "original template"
+        blob_mocks.download.properties.etag = '"etag-1"'
+        blob_mocks.blob.download_blob.side_effect = [
+            blob_mocks.download,
+            ResourceNotModifiedError("Not modified")
+        ]
+        mock_monotonic.side_effect = [100.0, 200.0, 200.0]
+        monkeypatch.setenv('PROMPT_TEMPLATE_TTL_SECONDS', '60')
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
+        client.get_template(blob_name='test.yaml')
+        result = client.get_template(blob_name='test.yaml')
         
         # Verify
-        with pytest.raises(AzureError, match="Azure service error"):
-            client.get_template(blob_name='test.yaml')
+        assert result == "original template"
+        assert blob_mocks.blob.download_blob.call_count == 2
+        blob_mocks.blob.download_blob.assert_called_with(
+            max_concurrency=4, etag='"etag-1"', match_condition=MatchConditions.IfModified
+        )
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_unexpected_error(self, mock_from_connection_string):
-        """Test handling of unexpected errors during blob download."""
+    @patch('blob_client.threading.Thread', InlineThread)
+    @patch('blob_client.time.monotonic')
+    def test_get_template_refreshes_after_ttl_when_modified(self, mock_monotonic, blob_mocks, monkeypatch):
+        """Test that an expired entry is served stale and replaced once the background refresh sees a change."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
+        first_download = Mock()
+        second_download = Mock()
+        first_download.content_as_text.return_value = "old template"
+        first_download.properties.etag = '"etag-1"'
+        second_download.content_as_text.return_value = "new template"
+        second_download.properties.etag = '"etag-2"'
+        blob_mocks.blob.download_blob.side_effect = [first_download, second_download]
+        mock_monotonic.side_effect = [100.0, 200.0, 200.0, 210.0]
+        monkeypatch.setenv('PROMPT_TEMPLATE_TTL_SECONDS', '60')
         
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.side_effect = RuntimeError("Unexpected error")
+        # Execute
+        client = AzureBlobTemplateClient(container_name='test-container')
+        first = client.get_template(blob_name='test.yaml')
+        stale = client.get_template(blob_name='test.yaml')
+        refreshed = client.get_template(blob_name='test.yaml')
         
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+        # Verify
+        assert first == "old template"
+        assert stale == "old template"
+        assert refreshed == "new template"
+        assert blob_mocks.blob.download_blob.call_count == 2
+
+    @patch('blob_client.threading.Thread', InlineThread)
+    @patch('blob_client.time.monotonic')
+    def test_get_template_background_refresh_failure_serves_cached(self, mock_monotonic, blob_mocks, monkeypatch):
+        """Test that a failed background refresh keeps serving the cached template."""
+        # Setup
+        blob_mocks.download.content_as_text.return_value = "cached template"
+        blob_mocks.download.properties.etag = '"etag-1"'
+        blob_mocks.blob.download_blob.side_effect = [
+            blob_mocks.download,
+            AzureError("Service unavailable")
+        ]
+        mock_monotonic.side_effect = [100.0, 200.0]
+        monkeypatch.setenv('PROMPT_TEMPLATE_TTL_SECONDS', '60')
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
+        client.get_template(blob_name='test.yaml')
+        result = client.get_template(blob_name='test.yaml')
         
         # Verify
-        with pytest.raises(RuntimeError, match="Unexpected error"):
-            client.get_template(blob_name='test.yaml')
+        assert result == "cached template"
+        assert client._refreshing == set()
 
-    @patch('blob_client.BlobServiceClient.from_connection_string')
-    def test_get_template_encoding_handling(self, mock_from_connection_string):
-        """Test that the template is correctly decoded with UTF-8 encoding."""
+    @patch('blob_client.threading.Thread')
+    @patch('blob_client.time.monotonic')
+    def test_get_template_starts_one_refresh_at_a_time(self, mock_monotonic, mock_thread, blob_mocks, monkeypatch):
+        """Test that a stale entry does not start a second refresh while one is in flight."""
         # Setup
-        mock_blob_service = Mock(spec=BlobServiceClient)
-        mock_container_client = Mock()
-        mock_blob_client = Mock()
-        mock_download_result = Mock()
+        blob_mocks.download.content_as_text.return_value = "cached template"
+        mock_monotonic.side_effect = [100.0, 200.0, 201.0]
+        monkeypatch.setenv('PROMPT_TEMPLATE_TTL_SECONDS', '60')
         
-        mock_from_connection_string.return_value = mock_blob_service
-        mock_blob_service.get_container_client.return_value = mock_container_client
-        mock_container_client.get_blob_client.return_value = mock_blob_client
-        mock_blob_client.download_blob.return_value = mock_download_result
-        mock_download_result.content_as_text.return_value = "UTF-8 content with special chars: ñáéíóú"
+        # Execute
+        client = AzureBlobTemplateClient(container_name='test-container')
+        client.get_template(blob_name='test.yaml')
+        client.get_template(blob_name='test.yaml')
+        client.get_template(blob_name='test.yaml')
         
-        os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+        # Verify
+        mock_thread.assert_called_once()
+        mock_thread.return_value.start.assert_called_once()
+
+    def test_get_template_uses_configured_concurrency(self, blob_mocks, monkeypatch):
+        """Test that downloads use the configured concurrency and a matching connection pool."""
+        # Setup
+        blob_mocks.download.content_as_text.return_value = "template"
+        monkeypatch.setenv('PROMPT_TEMPLATE_DOWNLOAD_CONCURRENCY', '8')
         
         # Execute
         client = AzureBlobTemplateClient(container_name='test-container')
-        result = client.get_template(blob_name='utf8-template.yaml')
+        client.get_template(blob_name='test.yaml')
         
         # Verify
-        assert result == "UTF-8 content with special chars: ñáéíóú"
-        mock_download_result.content_as_text.assert_called_once_with(encoding='utf-8')
+        blob_mocks.blob.download_blob.assert_called_once_with(max_concurrency=8)
+        transport = blob_mocks.from_connection_string.call_args.kwargs['transport']
+        adapter = transport.session.get_adapter('https://test.blob.core.windows.net')
+        assert adapter._pool_maxsize == 10
 
+    def test_default_transport_keeps_pool_size_and_disables_retries(self, blob_mocks):
+        """Test the default concurrency keeps a full-size pool and leaves retries to the SDK."""
+        # Execute
+        client = AzureBlobTemplateClient(container_name='test-container')
+        client.get_template(blob_name='test.yaml')
 
-# Fixtures for reuse across tests
-@pytest.fixture
-def mock_blob_service_client():
-    """Fixture providing a mocked BlobServiceClient."""
-    with patch('blob_client.BlobServiceClient.from_connection_string') as mock:
-        mock_service = Mock(spec=BlobServiceClient)
-        mock.return_value = mock_service
-        yield mock_service
+        # Verify
+        blob_mocks.blob.download_blob.assert_called_once_with(max_concurrency=4)
+        transport = blob_mocks.from_connection_string.call_args.kwargs['transport']
+        adapter = transport.session.get_adapter('https://test.blob.core.windows.net')
+        assert adapter._pool_maxsize == 10
+        assert adapter.max_retries.total is False
+        assert adapter.max_retries.redirect == 0
+        assert adapter.max_retries.raise_on_status is False
+
+    def test_close_closes_blob_service_client(self, blob_mocks):
+        """Test that close releases the underlying BlobServiceClient."""
+        # Setup
+        client = AzureBlobTemplateClient(container_name='test-container')
+        
+        # Execute
+        client.close()
+        
+        # Verify
+        blob_mocks.service.close.assert_called_once()
 
 
 # Example of parameterized test for different scenarios
@@ -277,19 +429,13 @@ def mock_blob_service_client():
     ("explicit-container", "explicit-container"),
     (None, "env-container"),  # When using environment variable
 ])
-def test_container_name_scenarios(container_name, expected_container, mock_blob_service_client):
+def test_container_name_scenarios(container_name, expected_container, blob_mocks, monkeypatch):
     """Test different ways of providing container name."""
-    # Setup environment if needed
-    if container_name is None:
-        os.environ['PROMPT_TEMPLATE_CONTAINER_NAME'] = expected_container
-    
-    os.environ['AZURE_STORAGE_CONNECTION_STRING'] = 'fake_connection_string'
+    # Setup - the environment value is only read when no container name is passed
+    monkeypatch.setenv('PROMPT_TEMPLATE_CONTAINER_NAME', 'env-container')
     
     # Execute
-    if container_name:
-        client = AzureBlobTemplateClient(container_name=container_name)
-    else:
-        client = AzureBlobTemplateClient()
+    AzureBlobTemplateClient(container_name=container_name)
     
     # Verify
-    mock_blob_service_client.get_container_client.assert_called_once_with(expected_container)
\ No newline at end of file
+    blob_mocks.service.get_container_client.assert_called_once_with(expected_container)
@@ -3,50 +3,155 @@ import asyncio
 import json
 import os
 import sys
-from unittest.mock import Mock, patch, AsyncMock, MagicMock, call
-from azure.servicebus import ServiceBusMessage
+from unittest.mock import Mock, patch, AsyncMock, MagicMock, call, ANY, DEFAULT
+from azure.servicebus import ServiceBusMessage, TransportType
 from azure.servicebus.exceptions import ServiceBusError
 import signal
-
-# Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-# Mock dotenv.load_dotenv() and environment validation before importing consumer module
-with patch('dotenv.load_dotenv'), \
-     patch.dict(os.environ, {
-         'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
-         'SERVICE_BUS_QUEUE_NAME': 'test_queue',
-         'AI_MODEL_NAME': 'gpt-4o',
-         'AI_API_KEY': 'fake_api_key',
-         'AI_ENDPOINT': 'https://fake.endpoint.com',
-         'API_VERSION': '2024-02-01'
-     }, clear=True):
-    from consumer import (
-        validate_environment_variables,
-        setup_signal_handlers,
-        safe_abandon_message,
-        safe_complete_message,
-        process_message_async,
-        cleanup_completed_tasks,
-        wait_for_available_slot,
-        graceful_shutdown_tasks,
-        run_service_bus_processor_async,
-        run_service_bus_processor,
-        shutdown_event
+from dataclasses import replace
+from types import MappingProxyType
+
+import consumer
+from ai_config import AIConfig
+from settler import MessageSettler
+from consumer import (
+    ConsumerConfig,
+    validate_environment_variables,
+    setup_signal_handlers,
+    install_event_loop_policy,
+    safe_abandon_message,
+    abandon_messages,
+    safe_complete_message,
+    process_message_async,
+    decode_payload,
+    message_body_bytes,
+    InvalidPayloadError,
+    next_backoff,
+    message_worker,
+    stop_workers,
+    graceful_shutdown_tasks,
+    run_receiver_async,
+    ReceiverLogAdapter,
+    run_service_bus_processor_async,
+    run_service_bus_processor,
+    shutdown_event,
+    DEFAULT_PREFETCH_COUNT,
+    SERVICE_BUS_RETRY_BACKOFF_FACTOR,
+    SERVICE_BUS_RETRY_BACKOFF_MAX,
+    ERROR_BACKOFF_MIN,
+    ERROR_BACKOFF_MAX
+)
+
+TEST_CONFIG = ConsumerConfig(
+    service_bus_connection_str='fake_connection_string',
+    queue_name='test_queue',
+    ai=AIConfig(
+        model_name='gpt-4o',
+        api_key='fake_api_key',
+        endpoint='https://fake.endpoint.com',
+        api_version='2024-02-01'
     )
+)
+
+# Sample message payload, encoded once and shared by the message tests
+SAMPLE_PAYLOAD = {
+    "skills_list": ["writing", "grammar"],
+    "essay": "This is a test essay for evaluation."
+}
+SAMPLE_BODY = (json.dumps(SAMPLE_PAYLOAD, separators=(',', ':')).encode('utf-8'),)
 
 # Enable async testing
 pytest_plugins = ('pytest_asyncio',)
 
 
+def async_context(value):
+    """Build an async context manager mock whose __aenter__ returns value."""
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=value)
+    context.__aexit__ = AsyncMock(return_value=None)
+    return context
+
+
+def wire_service_bus_client(mock_service_bus_client, messages, processing_mock):
+    """
+    Wire a patched ServiceBusClient to a mock receiver that returns messages on its first
+    receive and signals shutdown on the next one. Returns the client and receiver mocks.
+    A real receive waits on the link, letting the workers run; the second receive waits
+    until processing_mock has been called for every message, so shutdown does not abandon
+    the batch while it is still queued. Configure processing_mock's own side effect first.
+    """
+    mock_client_instance = AsyncMock()
+    mock_receiver = AsyncMock()
+    mock_service_bus_client.from_connection_string.return_value = async_context(mock_client_instance)
+
+    # The consumer enters the receiver itself, so it is its own async context manager
+    mock_client_instance.get_queue_receiver = Mock(return_value=mock_receiver)
+    mock_receiver.__aenter__ = AsyncMock(return_value=mock_receiver)
+    mock_receiver.__aexit__ = AsyncMock(return_value=None)
+
+    all_processed = asyncio.Event()
+    process = processing_mock.side_effect
+    async def processing_side_effect(*args, **kwargs):
+        if processing_mock.call_count >= len(messages):
+            all_processed.set()
+        if process is None:
+            return DEFAULT
+        return await process(*args, **kwargs)
+    processing_mock.side_effect = processing_side_effect
+
+    call_count = 0
+    async def receive_messages_side_effect(*args, **kwargs):
+        nonlocal call_count
+        call_count += 1
+        if call_count == 1:
+            return messages
+        await all_processed.wait()
+        shutdown_event.set()
+        return []
+    mock_receiver.receive_messages.side_effect = receive_messages_side_effect
+    return mock_client_instance, mock_receiver
+
+
+@pytest.fixture(scope="session")
+def required_env():
+    """Required environment variables matching TEST_CONFIG, built once per session."""
+    return MappingProxyType({
+        'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
+        'SERVICE_BUS_QUEUE_NAME': 'test_queue',
+        'AI_MODEL_NAME': 'gpt-4o',
+        'AI_API_KEY': 'fake_api_key',
+        'AI_ENDPOINT': 'https://fake.endpoint.com',
+        'API_VERSION': '2024-02-01'
+    })
+
+
+@pytest.fixture
+def set_required_env(monkeypatch, required_env):
+    """Set every required environment variable for a single test."""
+    for key, value in required_env.items():
+        monkeypatch.setenv(key, value)
+
+
+@pytest.fixture(autouse=True)
+def mock_prompt_processor_class():
+    """Avoid building a real PromptProcessor when the processor loop starts."""
+    with patch('prompt_processor.PromptProcessor') as mock_processor_class:
+        mock_processor_class.from_config.return_value = AsyncMock()
+        yield mock_processor_class
+
+
+@pytest.fixture(autouse=True)
+def mock_template_client():
+    """Avoid building a real AzureBlobTemplateClient when the processor loop starts."""
+    with patch('blob_client.AzureBlobTemplateClient') as mock_client_class:
+        yield mock_client_class
+
+
 class TestEnvironmentValidation:
     """Test suite for environment variable validation."""
 
-    def setup_method(self):
-        """Set up test fixtures before each test method."""
-        # Store original environment
-        self.original_env = os.environ.copy()
-        # Clear relevant environment variables
+    @pytest.fixture(autouse=True)
+    def clear_environment(self, monkeypatch):
+        """Remove the required environment variables for each test method."""
         env_vars_to_clear = [
             'SERVICE_BUS_CONNECTION_STR',
             'SERVICE_BUS_QUEUE_NAME',
@@ -56,70 +161,65 @@ class TestEnvironmentValidation:
             'API_VERSION'
         ]
         for var in env_vars_to_clear:
-            if var in os.environ:
-                del os.environ[var]
+            monkeypatch.delenv(var, raising=False)
 
-    def teardown_method(self):
-        """Clean up after each test method."""
-        # Restore original environment
-        os.environ.clear()
-        os.environ.update(self.original_env)
-
-    def test_validate_environment_variables_success(self):
+    def test_validate_environment_variables_success(self, monkeypatch, set_required_env):
         """Test successful validation when all required environment variables are present."""
-        # Setup
-        required_env_vars = {
-            'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
-            'SERVICE_BUS_QUEUE_NAME': 'test_queue',
-            'AI_MODEL_NAME': 'gpt-4o',
-            'AI_API_KEY': 'fake_api_key',
-            'AI_ENDPOINT': 'https://fake.endpoint.com',
-            'API_VERSION': '2024-02-01'
-        }
-        
-        # Clear environment variables that might be loaded from .env
-        env_vars_to_clear = [
-            'SERVICE_BUS_CONNECTION_STR', 'SERVICE_BUS_QUEUE_NAME', 'AI_MODEL_NAME',
-            'AI_API_KEY', 'AI_ENDPOINT', 'API_VERSION', 'AZURE_STORAGE_CONNECTION_STRING',
-            'PROMPT_TEMPLATE_CONTAINER_NAME', 'PROMPT_TEMPLATE_BLOB_NAME'
-        ]
-        for var in env_vars_to_clear:
-            if var in os.environ:
-                del os.environ[var]
-        
-        for key, value in required_env_vars.items():
-            os.environ[key] = value
+        # Setup - required variables come from set_required_env; clear optional ones that might be loaded from .env
+        for var in ['AZURE_STORAGE_CONNECTION_STRING', 'PROMPT_TEMPLATE_CONTAINER_NAME', 'PROMPT_TEMPLATE_BLOB_NAME']:
+            monkeypatch.delenv(var, raising=False)
 
         # Execute
         result = validate_environment_variables()
 
         # Verify
-        assert result == required_env_vars
+        assert result == TEST_CONFIG
 
-    def test_validate_environment_variables_missing_single_var(self):
+    def test_validate_environment_variables_optional_settings(self, required_env):
+        """Test optional settings are read into the returned config."""
+        # Setup
+        with patch.dict(os.environ, {
+            **required_env,
+            'SHUTDOWN_TIMEOUT': '45',
+            'SERVICE_BUS_RETRY_TOTAL': '2',
+            'SERVICE_BUS_USE_WEBSOCKETS': 'true',
+            'SERVICE_BUS_PREFETCH_COUNT': '50',
+            'SERVICE_BUS_RECEIVER_COUNT': '3'
+        }, clear=True):
+            # Execute
+            result = validate_environment_variables()
+
+        # Verify
+        assert result.shutdown_timeout == 45
+        assert result.retry_total == 2
+        assert result.use_websockets is True
+        assert result.prefetch_count == 50
+        assert result.receiver_count == 3
+
+    def test_validate_environment_variables_missing_single_var(self, monkeypatch):
         """Test validation failure when a single required variable is missing."""
         # Setup - missing AI_API_KEY
-        os.environ['SERVICE_BUS_CONNECTION_STR'] = 'fake_connection_string'
-        os.environ['SERVICE_BUS_QUEUE_NAME'] = 'test_queue'
-        os.environ['AI_MODEL_NAME'] = 'gpt-4o'
-        os.environ['AI_ENDPOINT'] = 'https://fake.endpoint.com'
-        os.environ['API_VERSION'] = '2024-02-01'
+        monkeypatch.setenv('SERVICE_BUS_CONNECTION_STR', 'fake_connection_string')
+        monkeypatch.setenv('SERVICE_BUS_QUEUE_NAME', 'test_queue')
+        monkeypatch.setenv('AI_MODEL_NAME', 'gpt-4o')
+        monkeypatch.setenv('AI_ENDPOINT', 'https://fake.endpoint.com')
+        monkeypatch.setenv('API_VERSION', '2024-02-01')
 
         # Execute & Verify
         with pytest.raises(ValueError, match="Missing required environment variables: AI_API_KEY"):
             validate_environment_variables()
 
-    def test_validate_environment_variables_missing_multiple_vars(self):
+    def test_validate_environment_variables_missing_multiple_vars(self, monkeypatch):
         """Test validation failure when multiple required variables are missing."""
         # Setup - only set a couple of variables
-        os.environ['SERVICE_BUS_CONNECTION_STR'] = 'fake_connection_string'
-        os.environ['AI_MODEL_NAME'] = 'gpt-4o'
+        monkeypatch.setenv('SERVICE_BUS_CONNECTION_STR', 'fake_connection_string')
+        monkeypatch.setenv('AI_MODEL_NAME', 'gpt-4o')
 
         # Execute & Verify
         with pytest.raises(ValueError, match="Missing required environment variables"):
             validate_environment_variables()
 
-    def test_validate_environment_variables_empty_values(self):
+    def test_validate_environment_variables_empty_values(self, monkeypatch):
         """Test validation failure when environment variables have empty values."""
         # Setup - set empty values
         required_env_vars = {
@@ -132,7 +232,7 @@ class TestEnvironmentValidation:
         }
         
         for key, value in required_env_vars.items():
-            os.environ[key] = value
+            monkeypatch.setenv(key, value)
 
         # Execute & Verify
         with pytest.raises(ValueError, match="Missing required environment variables"):
@@ -144,23 +244,67 @@ class TestSignalHandlers:
 
     def test_setup_signal_handlers(self):
         """Test that signal handlers are properly configured."""
+        # Setup
+        original_handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+        try:
+            # Execute
+            setup_signal_handlers()
+
+            # Verify - getsignal only reads the installed handler
+            for signum, original_handler in original_handlers.items():
+                handler = signal.getsignal(signum)
+                assert handler not in (signal.SIG_DFL, None)
+                assert handler is not original_handler
+        finally:
+            # Restore the original handlers
+            for signum, original_handler in original_handlers.items():
+                signal.signal(signum, original_handler)
+
+
+class TestEventLoopPolicy:
+    """Test suite for the optional uvloop event loop."""
+
+    @patch('consumer.asyncio.set_event_loop_policy')
+    def test_install_event_loop_policy_uses_uvloop(self, mock_set_policy):
+        """Test uvloop's policy is installed when uvloop is available."""
+        # Setup
+        fake_uvloop = Mock()
+
         # Execute
-        setup_signal_handlers()
+        with patch.dict(sys.modules, {'uvloop': fake_uvloop}), patch('consumer.sys.platform', 'linux'):
+            result = install_event_loop_policy()
 
-        # Verify that signal handlers are set (this is a basic test)
-        # In a real scenario, testing signal handling is complex and may require more sophisticated approaches
-        assert signal.signal(signal.SIGTERM, signal.SIG_DFL) != signal.SIG_DFL
-        assert signal.signal(signal.SIGINT, signal.SIG_DFL) != signal.SIG_DFL
-        
-        # Restore default handlers
-        signal.signal(signal.SIGTERM, signal.SIG_DFL)
-        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        # Verify
+        assert result is True
+        mock_set_policy.assert_called_once_with(fake_uvloop.EventLoopPolicy.return_value)
+
+    @patch('consumer.asyncio.set_event_loop_policy')
+    def test_install_event_loop_policy_without_uvloop(self, mock_set_policy):
+        """Test the default loop is kept when uvloop is not installed."""
+        # Execute
+        with patch.dict(sys.modules, {'uvloop': None}), patch('consumer.sys.platform', 'linux'):
+            result = install_event_loop_policy()
+
+        # Verify
+        assert result is False
+        mock_set_policy.assert_not_called()
+
+    @patch('consumer.asyncio.set_event_loop_policy')
+    def test_install_event_loop_policy_skipped_on_windows(self, mock_set_policy):
+        """Test uvloop is not used on Windows."""
+        # Execute
+        with patch.dict(sys.modules, {'uvloop': Mock()}), patch('consumer.sys.platform', 'win32'):
+            result = install_event_loop_policy()
+
+        # Verify
+        assert result is False
+        mock_set_policy.assert_not_called()
 
 
 class TestMessageHandling:
     """Test suite for Service Bus message handling functions."""
 
-    @pytest.mark.asyncio
     async def test_safe_abandon_message_success(self):
         """Test successful message abandonment."""
         # Setup
@@ -172,9 +316,8 @@ class TestMessageHandling:
         await safe_abandon_message(mock_receiver, mock_message)
 
         # Verify
-        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
 
-    @pytest.mark.asyncio
     async def test_safe_abandon_message_failure(self):
         """Test message abandonment handles exceptions gracefully."""
         # Setup
@@ -186,9 +329,34 @@ class TestMessageHandling:
         await safe_abandon_message(mock_receiver, mock_message)
 
         # Verify
-        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
+
+    async def test_abandon_messages_abandons_each_message(self):
+        """Test every message in a batch is abandoned."""
+        # Setup
+        mock_receiver = AsyncMock()
+        messages = [Mock(), Mock(), Mock()]
+
+        # Execute
+        await abandon_messages(mock_receiver, messages)
+
+        # Verify
+        assert mock_receiver.abandon_message.await_count == 3
+        mock_receiver.abandon_message.assert_has_awaits([call(m) for m in messages], any_order=True)
+
+    async def test_abandon_messages_continues_after_failure(self):
+        """Test one failed abandon does not stop the rest of the batch."""
+        # Setup
+        mock_receiver = AsyncMock()
+        messages = [Mock(), Mock()]
+        mock_receiver.abandon_message.side_effect = [ServiceBusError("Abandon failed"), None]
+
+        # Execute (should not raise exception)
+        await abandon_messages(mock_receiver, messages)
+
+        # Verify
+        assert mock_receiver.abandon_message.await_count == 2
 
-    @pytest.mark.asyncio
     async def test_safe_complete_message_success(self):
         """Test successful message completion."""
         # Setup
@@ -200,9 +368,8 @@ class TestMessageHandling:
         await safe_complete_message(mock_receiver, mock_message)
 
         # Verify
-        mock_receiver.complete_message.assert_called_once_with(mock_message)
+        mock_receiver.complete_message.assert_awaited_once_with(mock_message)
 
-    @pytest.mark.asyncio
     async def test_safe_complete_message_failure_calls_abandon(self):
         """Test that failed message completion calls abandon."""
         # Setup
@@ -215,207 +382,224 @@ class TestMessageHandling:
         await safe_complete_message(mock_receiver, mock_message)
 
         # Verify
-        mock_receiver.complete_message.assert_called_once_with(mock_message)
-        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_receiver.complete_message.assert_awaited_once_with(mock_message)
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
 
 
 class TestMessageProcessing:
     """Test suite for message processing functionality."""
 
-    @pytest.mark.asyncio
-    @patch('consumer.PromptProcessor')
-    async def test_process_message_async_success(self, mock_prompt_processor_class):
+    async def test_process_message_async_success(self):
         """Test successful message processing."""
         # Setup
         mock_receiver = AsyncMock()
         mock_message = Mock()
         mock_prompt_processor = AsyncMock()
-        mock_prompt_processor_class.return_value.__aenter__.return_value = mock_prompt_processor
         
         # Create valid JSON message
-        test_payload = {
-            "skills_list": ["writing", "grammar"],
-            "essay": "This is a test essay."
-        }
-        message_body = json.dumps(test_payload).encode('utf-8')
-        mock_message.body = [message_body]
+        mock_message.body = SAMPLE_BODY
         
         mock_prompt_processor.process_payload.return_value = "Evaluation complete"
         mock_receiver.complete_message.return_value = None
 
         # Execute
-        await process_message_async(
-            mock_message, mock_receiver, 
-            "gpt-4o", "fake_key", "https://fake.endpoint.com", "2024-02-01"
-        )
+        await process_message_async(mock_message, mock_receiver, mock_prompt_processor)
 
         # Verify
-        mock_prompt_processor.process_payload.assert_called_once_with(test_payload)
-        mock_receiver.complete_message.assert_called_once_with(mock_message)
+        mock_prompt_processor.process_payload.assert_awaited_once_with(SAMPLE_PAYLOAD)
+        mock_receiver.complete_message.assert_awaited_once_with(mock_message)
+
+    async def test_process_message_async_multi_section_body(self):
+        """Test message bodies split across several sections are joined before decoding."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_message = Mock()
+        mock_prompt_processor = AsyncMock()
+
+        test_payload = {
+            "skills_list": ["writing"],
+            "essay": "Ensaio de teste com acentuação."
+        }
+        message_body = json.dumps(test_payload, ensure_ascii=False).encode('utf-8')
+        mock_message.body = iter([message_body[:10], message_body[10:]])
+
+        # Execute
+        await process_message_async(mock_message, mock_receiver, mock_prompt_processor)
+
+        # Verify
+        mock_prompt_processor.process_payload.assert_awaited_once_with(test_payload)
+        mock_receiver.complete_message.assert_awaited_once_with(mock_message)
 
-    @pytest.mark.asyncio
     async def test_process_message_async_invalid_json(self):
         """Test processing of message with invalid JSON."""
         # Setup
         mock_receiver = AsyncMock()
         mock_message = Mock()
+        mock_prompt_processor = AsyncMock()
         mock_message.body = [b"invalid json content"]
         mock_receiver.abandon_message.return_value = None
 
         # Execute
-        await process_message_async(
-            mock_message, mock_receiver,
-            "gpt-4o", "fake_key", "https://fake.endpoint.com", "2024-02-01"
-        )
+        await process_message_async(mock_message, mock_receiver, mock_prompt_processor)
+
+        # Verify
+        mock_prompt_processor.process_payload.assert_not_awaited()
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
+
+    @pytest.mark.parametrize("payload", [
+        ["not", "an", "object"],
+        {"skills_list": ["writing"]},
+        {"skills_list": ["writing"], "essay": ""},
+        {"skills_list": "writing", "essay": "Test"}
+    ])
+    async def test_process_message_async_invalid_payload(self, payload):
+        """Test messages with the wrong payload shape are abandoned without calling the AI."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_message = Mock()
+        mock_prompt_processor = AsyncMock()
+        mock_message.body = [json.dumps(payload).encode('utf-8')]
+
+        # Execute
+        await process_message_async(mock_message, mock_receiver, mock_prompt_processor)
 
         # Verify
-        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_prompt_processor.process_payload.assert_not_awaited()
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
+
+    def test_decode_payload_defaults_skills_list(self):
+        """Test a payload without skills_list is accepted as-is."""
+        # Execute
+        result = decode_payload(b'{"essay": "Test"}')
+
+        # Verify
+        assert result == {"essay": "Test"}
+
+    def test_message_body_bytes_single_section(self):
+        """Test a single-section body is returned without being joined."""
+        # Setup
+        section = b'{"essay": "Test"}'
+        mock_message = Mock()
+        mock_message.body = iter([section])
 
-    @pytest.mark.asyncio
-    @patch('consumer.PromptProcessor')
-    async def test_process_message_async_processing_error(self, mock_prompt_processor_class):
+        # Execute & Verify
+        assert message_body_bytes(mock_message) is section
+
+    def test_message_body_bytes_multiple_sections(self):
+        """Test a multi-section body is joined into one buffer."""
+        # Setup
+        mock_message = Mock()
+        mock_message.body = iter([b'{"essay": ', b'"Test"}'])
+
+        # Execute & Verify
+        assert message_body_bytes(mock_message) == b'{"essay": "Test"}'
+
+    def test_message_body_bytes_bytes_body(self):
+        """Test a bytes body is used directly rather than iterated."""
+        # Setup
+        mock_message = Mock()
+        mock_message.body = b'{"essay": "Test"}'
+
+        # Execute & Verify
+        assert message_body_bytes(mock_message) is mock_message.body
+
+    def test_decode_payload_rejects_non_object(self):
+        """Test a JSON array is rejected with InvalidPayloadError."""
+        # Execute & Verify
+        with pytest.raises(InvalidPayloadError, match="JSON object"):
+            decode_payload(b'[]')
+
+    async def test_process_message_async_processing_error(self):
         """Test message processing handles processing errors."""
         # Setup
         mock_receiver = AsyncMock()
         mock_message = Mock()
         mock_prompt_processor = AsyncMock()
-        mock_prompt_processor_class.return_value.__aenter__.return_value = mock_prompt_processor
         
-        test_payload = {"skills_list": [], "essay": "Test"}
-        message_body = json.dumps(test_payload).encode('utf-8')
-        mock_message.body = [message_body]
+        mock_message.body = SAMPLE_BODY
         
         mock_prompt_processor.process_payload.side_effect = Exception("Processing failed")
         mock_receiver.abandon_message.return_value = None
 
         # Execute
-        await process_message_async(
-            mock_message, mock_receiver,
-            "gpt-4o", "fake_key", "https://fake.endpoint.com", "2024-02-01"
-        )
+        await process_message_async(mock_message, mock_receiver, mock_prompt_processor)
 
         # Verify
-        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_receiver.abandon_message.assert_awaited_once_with(mock_message)
 
 
 class TestTaskManagement:
     """Test suite for task management functions."""
 
-    @pytest.mark.asyncio
-    async def test_cleanup_completed_tasks_empty_set(self):
-        """Test cleanup with empty task set."""
-        # Execute
-        result = await cleanup_completed_tasks(set())
-        
-        # Verify
-        assert result == set()
+    def test_next_backoff_doubles(self):
+        """Test the backoff doubles while below the cap."""
+        # Execute & Verify
+        assert next_backoff(ERROR_BACKOFF_MIN, ERROR_BACKOFF_MAX) == ERROR_BACKOFF_MIN * 2
 
-    @pytest.mark.asyncio
-    async def test_cleanup_completed_tasks_no_completed(self):
-        """Test cleanup when no tasks are completed."""
+    def test_next_backoff_is_capped(self):
+        """Test the backoff never exceeds the maximum."""
+        # Execute & Verify
+        assert next_backoff(ERROR_BACKOFF_MAX, ERROR_BACKOFF_MAX) == ERROR_BACKOFF_MAX
+        assert next_backoff(4.0, ERROR_BACKOFF_MAX) == ERROR_BACKOFF_MAX
+
+    @patch('consumer.process_message_async')
+    async def test_message_worker_processes_until_sentinel(self, mock_process_message):
+        """Test a worker processes queued messages in order and exits on the sentinel."""
         # Setup
-        task1 = asyncio.create_task(asyncio.sleep(1))
-        task2 = asyncio.create_task(asyncio.sleep(1))
-        tasks = {task1, task2}
+        mock_receiver = AsyncMock()
+        mock_prompt_processor = AsyncMock()
+        messages = [Mock(), Mock()]
+        queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        queue.put_nowait(None)
 
-        try:
-            # Execute
-            result = await cleanup_completed_tasks(tasks)
-            
-            # Verify
-            assert result == tasks
-        finally:
-            # Cleanup
-            task1.cancel()
-            task2.cancel()
-            try:
-                await task1
-            except asyncio.CancelledError:
-                pass
-            try:
-                await task2
-            except asyncio.CancelledError:
-                pass
+        # Execute
+        await asyncio.wait_for(message_worker(queue, mock_receiver, mock_prompt_processor), timeout=1)
 
-    @pytest.mark.asyncio
-    async def test_cleanup_completed_tasks_with_completed(self):
-        """Test cleanup removes completed tasks."""
+        # Verify
+        mock_process_message.assert_has_calls(
+            [call(message, mock_receiver, mock_prompt_processor) for message in messages]
+        )
+        assert queue.empty()
+
+    @patch('consumer.process_message_async')
+    async def test_message_worker_survives_processing_error(self, mock_process_message):
+        """Test an unexpected error does not stop the worker."""
         # Setup
-        async def quick_task():
-            return "completed"
-        
-        task1 = asyncio.create_task(quick_task())
-        task2 = asyncio.create_task(asyncio.sleep(1))
-        tasks = {task1, task2}
-        
-        # Wait for first task to complete
-        await asyncio.sleep(0.1)
+        mock_process_message.side_effect = [RuntimeError("boom"), None]
+        queue = asyncio.Queue()
+        queue.put_nowait(Mock())
+        queue.put_nowait(Mock())
+        queue.put_nowait(None)
 
-        try:
-            # Execute
-            result = await cleanup_completed_tasks(tasks)
-            
-            # Verify
-            assert task1 not in result
-            assert task2 in result or len(result) == 0  # task2 might also complete quickly
-        finally:
-            # Cleanup
-            task2.cancel()
-            try:
-                await task2
-            except asyncio.CancelledError:
-                pass
+        # Execute
+        await asyncio.wait_for(message_worker(queue, AsyncMock(), AsyncMock()), timeout=1)
 
-    @pytest.mark.asyncio
-    async def test_wait_for_available_slot_under_limit(self):
-        """Test wait_for_available_slot when under concurrency limit."""
+        # Verify
+        assert mock_process_message.call_count == 2
+
+    async def test_stop_workers_abandons_queued_messages(self):
+        """Test queued messages are abandoned and idle workers exit on shutdown."""
         # Setup
-        task1 = asyncio.create_task(asyncio.sleep(1))
-        tasks = {task1}
+        mock_receiver = AsyncMock()
+        queue = asyncio.Queue()
+        workers = [
+            asyncio.create_task(message_worker(queue, mock_receiver, AsyncMock()))
+            for _ in range(2)
+        ]
+        queued_messages = [Mock(), Mock()]
 
-        try:
-            # Execute
-            result = await wait_for_available_slot(tasks, max_concurrent_tasks=5)
-            
-            # Verify
-            assert result == tasks
-        finally:
-            # Cleanup
-            task1.cancel()
-            try:
-                await task1
-            except asyncio.CancelledError:
-                pass
+        # Execute - queue the messages without yielding so no worker picks them up
+        for message in queued_messages:
+            queue.put_nowait(message)
+        result = await stop_workers(queue, workers, mock_receiver, timeout=1)
 
-    @pytest.mark.asyncio
-    async def test_wait_for_available_slot_at_limit(self):
-        """Test wait_for_available_slot when at concurrency limit."""
-        # Setup
-        async def quick_task():
-            await asyncio.sleep(0.1)
-            return "completed"
-        
-        task1 = asyncio.create_task(quick_task())
-        task2 = asyncio.create_task(asyncio.sleep(1))
-        tasks = {task1, task2}
+        # Verify
+        assert result is True
+        assert all(worker.done() for worker in workers)
+        mock_receiver.abandon_message.assert_has_calls([call(m) for m in queued_messages], any_order=True)
 
-        try:
-            # Execute
-            result = await wait_for_available_slot(tasks, max_concurrent_tasks=2)
-            
-            # Verify that at least one task completed
-            assert len(result) < len(tasks)
-        finally:
-            # Cleanup
-            for task in tasks:
-                if not task.done():
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-
-    @pytest.mark.asyncio
     async def test_graceful_shutdown_tasks_empty_set(self):
         """Test graceful shutdown with empty task set."""
         # Execute
@@ -424,33 +608,33 @@ class TestTaskManagement:
         # Verify
         assert result is True
 
-    @pytest.mark.asyncio
     async def test_graceful_shutdown_tasks_successful(self):
         """Test graceful shutdown when all tasks complete in time."""
         # Setup
+        release = asyncio.Event()
         async def quick_task():
-            await asyncio.sleep(0.1)
+            await release.wait()
             return "completed"
         
         task1 = asyncio.create_task(quick_task())
         task2 = asyncio.create_task(quick_task())
         tasks = {task1, task2}
 
-        # Execute
+        # Execute - release the tasks so they finish as soon as shutdown waits on them
+        release.set()
         result = await graceful_shutdown_tasks(tasks, timeout=1)
         
         # Verify
         assert result is True
 
-    @pytest.mark.asyncio
     async def test_graceful_shutdown_tasks_timeout(self):
         """Test graceful shutdown when tasks timeout."""
         # Setup
-        task1 = asyncio.create_task(asyncio.sleep(2))  # Will timeout
+        task1 = asyncio.get_running_loop().create_future()  # Never resolved, so it times out
         tasks = {task1}
 
         # Execute
-        result = await graceful_shutdown_tasks(tasks, timeout=0.1)
+        result = await graceful_shutdown_tasks(tasks, timeout=0)
         
         # Verify
         assert result is False
@@ -460,35 +644,18 @@ class TestTaskManagement:
 class TestServiceBusProcessor:
     """Test suite for the main Service Bus processor."""
 
-    def setup_method(self):
-        """Set up test fixtures before each test method."""
+    @pytest.fixture(autouse=True)
+    def processor_environment(self, set_required_env):
+        """Apply the required environment and reset the shutdown event around each test."""
         # Clear shutdown event
         shutdown_event.clear()
-        
-        # Store original environment
-        self.original_env = os.environ.copy()
-        
-        # Set required environment variables
-        os.environ.update({
-            'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
-            'SERVICE_BUS_QUEUE_NAME': 'test_queue',
-            'AI_MODEL_NAME': 'gpt-4o',
-            'AI_API_KEY': 'fake_api_key',
-            'AI_ENDPOINT': 'https://fake.endpoint.com',
-            'API_VERSION': '2024-02-01'
-        })
 
-    def teardown_method(self):
-        """Clean up after each test method."""
+        yield
+
         # Clear shutdown event
         shutdown_event.clear()
-        
-        # Restore original environment
-        os.environ.clear()
-        os.environ.update(self.original_env)
 
-    @pytest.mark.asyncio
-    @patch('consumer.AsyncServiceBusClient')
+    @patch('azure.servicebus.aio.ServiceBusClient')
     async def test_run_service_bus_processor_async_immediate_shutdown(self, mock_service_bus_client):
         """Test processor handles immediate shutdown signal."""
         # Setup
@@ -500,57 +667,227 @@ class TestServiceBusProcessor:
         # Mock the async context manager for client
         mock_client_instance = AsyncMock()
         mock_client_instance.get_queue_receiver.return_value = mock_receiver
-        mock_service_bus_client.from_connection_string.return_value.__aenter__.return_value = mock_client_instance
-        mock_service_bus_client.from_connection_string.return_value.__aexit__.return_value = None
+        mock_service_bus_client.from_connection_string.return_value = async_context(mock_client_instance)
 
         # Execute
-        await run_service_bus_processor_async()
+        await run_service_bus_processor_async(TEST_CONFIG)
         
         # Verify that the client was NOT created due to immediate shutdown
         mock_service_bus_client.from_connection_string.assert_not_called()
 
-    @pytest.mark.asyncio
-    @patch('consumer.AsyncServiceBusClient')
+    @patch('azure.servicebus.aio.ServiceBusClient')
     @patch('consumer.process_message_async')
     async def test_run_service_bus_processor_async_message_processing(self, mock_process_message, mock_service_bus_client):
         """Test processor handles message processing correctly."""
-        # Setup
-        mock_client_instance = AsyncMock()
-        mock_receiver = AsyncMock()
-        
-        # Mock the async context manager for client
-        mock_service_bus_client.from_connection_string.return_value.__aenter__.return_value = mock_client_instance
-        mock_service_bus_client.from_connection_string.return_value.__aexit__.return_value = None
-        
-        # Mock the async context manager for receiver - make it return the async context manager directly
-        mock_client_instance.get_queue_receiver = Mock(return_value=mock_receiver)
-        mock_receiver.__aenter__ = AsyncMock(return_value=mock_receiver)
-        mock_receiver.__aexit__ = AsyncMock(return_value=None)
-        
-        # Create a mock message
+        # Setup - the receiver returns one message, then signals shutdown
         mock_message = Mock()
-        mock_receiver.receive_messages.side_effect = [
-            [mock_message],  # First call returns one message
-            []  # Second call returns no messages, triggering shutdown
-        ]
-        
-        # Setup async mock for message processing
         mock_process_message.return_value = None
-        
-        # Set shutdown after first iteration
-        async def side_effect(*args):
-            shutdown_event.set()
-            
-        mock_process_message.side_effect = side_effect
+        mock_client_instance, mock_receiver = wire_service_bus_client(
+            mock_service_bus_client, [mock_message], mock_process_message
+        )
 
         # Execute
-        await run_service_bus_processor_async()
+        await run_service_bus_processor_async(TEST_CONFIG)
         
         # Verify
+        mock_service_bus_client.from_connection_string.assert_called_once_with(
+            'fake_connection_string',
+            retry_total=TEST_CONFIG.retry_total,
+            retry_backoff_factor=SERVICE_BUS_RETRY_BACKOFF_FACTOR,
+            retry_backoff_max=SERVICE_BUS_RETRY_BACKOFF_MAX,
+            transport_type=TransportType.Amqp
+        )
+        mock_client_instance.get_queue_receiver.assert_called_once_with(
+            queue_name='test_queue',
+            prefetch_count=DEFAULT_PREFETCH_COUNT
+        )
         mock_receiver.receive_messages.assert_called()
         mock_process_message.assert_called_once()
 
-    def test_run_service_bus_processor_missing_env_vars(self):
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    @patch('consumer.process_message_async')
+    async def test_run_service_bus_processor_async_shares_processor(self, mock_process_message, mock_service_bus_client,
+                                                                    mock_prompt_processor_class, mock_template_client):
+        """Test one PromptProcessor is built per run and handed to every message."""
+        # Setup
+        messages = [Mock(), Mock(), Mock()]
+        wire_service_bus_client(mock_service_bus_client, messages, mock_process_message)
+
+        # Execute
+        await run_service_bus_processor_async(TEST_CONFIG)
+
+        # Verify
+        mock_template_client.assert_called_once_with()
+        mock_prompt_processor_class.from_config.assert_called_once_with(
+            TEST_CONFIG.ai,
+            blob_client=mock_template_client.return_value
+        )
+        processor = mock_prompt_processor_class.from_config.return_value
+        mock_process_message.assert_has_calls(
+            [call(message, ANY, processor) for message in messages], any_order=True
+        )
+        settlers = {c.args[1] for c in mock_process_message.call_args_list}
+        assert len(settlers) == 1
+        assert isinstance(settlers.pop(), MessageSettler)
+        processor.__aexit__.assert_awaited_once()
+
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    @patch('consumer.process_message_async')
+    async def test_run_service_bus_processor_async_bounds_concurrency(self, mock_process_message, mock_service_bus_client):
+        """Test processor never runs more than the concurrency limit at once."""
+        # Setup
+        messages = [Mock() for _ in range(15)]
+        in_flight = 0
+        max_in_flight = 0
+        async def process_side_effect(*args):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+        mock_process_message.side_effect = process_side_effect
+        wire_service_bus_client(mock_service_bus_client, messages, mock_process_message)
+
+        # Execute
+        await run_service_bus_processor_async(TEST_CONFIG)
+
+        # Verify
+        assert mock_process_message.call_count == len(messages)
+        assert max_in_flight <= 10
+
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    async def test_run_service_bus_processor_async_uses_websockets(self, mock_service_bus_client):
+        """Test the client is created with AMQP over websockets when enabled."""
+        # Setup
+        def connect_side_effect(*args, **kwargs):
+            shutdown_event.set()
+            raise Exception("Connection failed")
+        mock_service_bus_client.from_connection_string.side_effect = connect_side_effect
+
+        # Execute
+        await run_service_bus_processor_async(replace(TEST_CONFIG, use_websockets=True))
+
+        # Verify
+        _, kwargs = mock_service_bus_client.from_connection_string.call_args
+        assert kwargs['transport_type'] == TransportType.AmqpOverWebsocket
+
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    async def test_run_service_bus_processor_async_multiple_receivers(self, mock_service_bus_client,
+                                                                      mock_prompt_processor_class):
+        """Test each receiver gets its own client while sharing one PromptProcessor."""
+        # Setup
+        def connect_side_effect(*args, **kwargs):
+            if mock_service_bus_client.from_connection_string.call_count == 3:
+                shutdown_event.set()
+            raise Exception("Connection failed")
+        mock_service_bus_client.from_connection_string.side_effect = connect_side_effect
+
+        # Execute
+        await run_service_bus_processor_async(replace(TEST_CONFIG, receiver_count=3))
+
+        # Verify
+        assert mock_service_bus_client.from_connection_string.call_count == 3
+        mock_prompt_processor_class.from_config.assert_called_once()
+
+    @patch('consumer.run_receiver_async')
+    async def test_run_service_bus_processor_async_failed_receiver_cancels_others(self, mock_run_receiver,
+                                                                                 mock_prompt_processor_class):
+        """Test a receiver that gives up cancels the others before the shared processor is cleaned up."""
+        # Setup
+        processor = mock_prompt_processor_class.from_config.return_value
+        cancelled_before_cleanup = []
+        async def run_receiver_side_effect(config, prompt_processor, transport_type, worker_count, receiver_logger):
+            if receiver_logger.extra['receiver'] == 0:
+                await asyncio.sleep(0)
+                raise ServiceBusError("Max retries exceeded")
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled_before_cleanup.append(not processor.__aexit__.await_count)
+                raise
+        mock_run_receiver.side_effect = run_receiver_side_effect
+
+        # Execute & Verify
+        with pytest.raises(ServiceBusError, match="Max retries exceeded"):
+            await run_service_bus_processor_async(replace(TEST_CONFIG, receiver_count=3))
+        assert cancelled_before_cleanup == [True, True]
+        processor.__aexit__.assert_awaited_once()
+
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    @patch('consumer.process_message_async')
+    async def test_run_receiver_async_cancel_stops_workers(self, mock_process_message, mock_service_bus_client):
+        """Test cancelling a receiver cancels its worker and abandons the messages still queued."""
+        # Setup
+        messages = [Mock(), Mock(), Mock()]
+        processing_started = asyncio.Event()
+        worker_cancelled = False
+        async def process_side_effect(*args):
+            nonlocal worker_cancelled
+            processing_started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                worker_cancelled = True
+                raise
+        mock_process_message.side_effect = process_side_effect
+        _, mock_receiver = wire_service_bus_client(mock_service_bus_client, messages, mock_process_message)
+
+        # The worker never finishes, so the second receive just waits to be cancelled
+        receive_waiting = asyncio.Event()
+        async def receive_messages_side_effect(*args, **kwargs):
+            if mock_receiver.receive_messages.call_count == 1:
+                return messages
+            receive_waiting.set()
+            await asyncio.Event().wait()
+        mock_receiver.receive_messages.side_effect = receive_messages_side_effect
+
+        receiver_task = asyncio.create_task(
+            run_receiver_async(TEST_CONFIG, AsyncMock(), TransportType.Amqp, 1, ReceiverLogAdapter(consumer.logger, {"receiver": 0}))
+        )
+        await asyncio.wait_for(asyncio.gather(processing_started.wait(), receive_waiting.wait()), timeout=1)
+
+        # Execute
+        receiver_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await receiver_task
+
+        # Verify
+        assert worker_cancelled
+        assert mock_receiver.abandon_message.await_args_list == [call(messages[1]), call(messages[2])]
+
+    @patch('consumer.run_receiver_async')
+    async def test_run_service_bus_processor_async_receivers_capped_by_workers(self, mock_run_receiver):
+        """Test more receivers than workers are capped so the total worker count stays bounded."""
+        # Execute
+        await run_service_bus_processor_async(replace(TEST_CONFIG, receiver_count=15))
+
+        # Verify
+        assert mock_run_receiver.await_count == 10
+        assert {c.args[3] for c in mock_run_receiver.call_args_list} == {1}
+
+    @patch('consumer.run_receiver_async')
+    async def test_run_service_bus_processor_async_shares_out_remaining_workers(self, mock_run_receiver):
+        """Test workers that do not divide evenly go to the first receivers instead of being dropped."""
+        # Execute
+        await run_service_bus_processor_async(replace(TEST_CONFIG, receiver_count=3))
+
+        # Verify
+        assert [c.args[3] for c in mock_run_receiver.call_args_list] == [4, 3, 3]
+
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    async def test_run_service_bus_processor_async_retry_wait_stops_on_shutdown(self, mock_service_bus_client):
+        """Test a shutdown during the retry backoff ends the wait without another connection attempt."""
+        # Setup
+        mock_service_bus_client.from_connection_string.side_effect = Exception("Connection failed")
+        asyncio.get_running_loop().call_later(0.05, shutdown_event.set)
+
+        # Execute
+        await asyncio.wait_for(run_service_bus_processor_async(TEST_CONFIG), timeout=1)
+
+        # Verify
+        mock_service_bus_client.from_connection_string.assert_called_once()
+
+    def test_run_service_bus_processor_missing_env_vars(self, monkeypatch):
         """Test that processor raises error when environment variables are missing."""
         # Setup - clear ALL environment variables that might be loaded from .env
         env_vars_to_clear = [
@@ -559,104 +896,70 @@ class TestServiceBusProcessor:
             'PROMPT_TEMPLATE_CONTAINER_NAME', 'PROMPT_TEMPLATE_BLOB_NAME'
         ]
         for var in env_vars_to_clear:
-            if var in os.environ:
-                del os.environ[var]
+            monkeypatch.delenv(var, raising=False)
 
-        # Execute & Verify - expect SystemExit due to connection failure, not ValueError
-        with pytest.raises(SystemExit):
+        # Execute & Verify - the validation ValueError is reported and exits
+        with patch('consumer.dotenv.load_dotenv'), pytest.raises(SystemExit):
             run_service_bus_processor()
 
+    @patch('consumer.install_event_loop_policy')
     @patch('consumer.setup_signal_handlers')
     @patch('consumer.asyncio.run')
-    def test_run_service_bus_processor_signal_setup(self, mock_asyncio_run, mock_setup_signals):
+    def test_run_service_bus_processor_signal_setup(self, mock_asyncio_run, mock_setup_signals, mock_install_policy):
         """Test that signal handlers are set up when running processor."""
-        # Setup
-        mock_asyncio_run.side_effect = KeyboardInterrupt()  # Simulate interrupt
+        # Setup - close the coroutine asyncio.run would have awaited, then simulate an interrupt
+        def asyncio_run_side_effect(coro):
+            coro.close()
+            raise KeyboardInterrupt()
+        mock_asyncio_run.side_effect = asyncio_run_side_effect
         
         # Execute
         run_service_bus_processor()
         
         # Verify
         mock_setup_signals.assert_called_once()
+        mock_install_policy.assert_called_once()
         mock_asyncio_run.assert_called_once()
 
 
 class TestIntegration:
     """Integration tests for the complete consumer functionality."""
 
-    def setup_method(self):
-        """Set up test fixtures before each test method."""
+    @pytest.fixture(autouse=True)
+    def integration_environment(self, set_required_env):
+        """Apply the complete environment and reset the shutdown event around each test."""
         shutdown_event.clear()
-        self.original_env = os.environ.copy()
-        
-        # Set up complete environment
-        os.environ.update({
-            'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
-            'SERVICE_BUS_QUEUE_NAME': 'test_queue',
-            'AI_MODEL_NAME': 'gpt-4o',
-            'AI_API_KEY': 'fake_api_key',
-            'AI_ENDPOINT': 'https://fake.endpoint.com',
-            'API_VERSION': '2024-02-01'
-        })
 
-    def teardown_method(self):
-        """Clean up after each test method."""
+        yield
+
         shutdown_event.clear()
-        os.environ.clear()
-        os.environ.update(self.original_env)
 
-    @pytest.mark.asyncio
-    @patch('consumer.AsyncServiceBusClient')
-    @patch('consumer.PromptProcessor')
+    @patch('azure.servicebus.aio.ServiceBusClient')
+    @patch('prompt_processor.PromptProcessor')
     async def test_end_to_end_message_processing(self, mock_prompt_processor_class, mock_service_bus_client):
         """Test complete end-to-end message processing flow."""
         # Setup
-        mock_client_instance = AsyncMock()
-        mock_receiver = AsyncMock()
         mock_prompt_processor = AsyncMock()
         
-        # Mock the async context manager for client
-        mock_service_bus_client.from_connection_string.return_value.__aenter__.return_value = mock_client_instance
-        mock_service_bus_client.from_connection_string.return_value.__aexit__.return_value = None
-        
-        # Mock the async context manager for receiver - make it return the async context manager directly
-        mock_client_instance.get_queue_receiver = Mock(return_value=mock_receiver)
-        mock_receiver.__aenter__ = AsyncMock(return_value=mock_receiver)
-        mock_receiver.__aexit__ = AsyncMock(return_value=None)
+        # The shared prompt processor is constructed once and reused
+        mock_prompt_processor_class.from_config.return_value = mock_prompt_processor
         
-        # Mock the async context manager for prompt processor
-        mock_prompt_processor_class.return_value.__aenter__.return_value = mock_prompt_processor
-        mock_prompt_processor_class.return_value.__aexit__.return_value = None
-        
-        # Create test message
-        test_payload = {
-            "skills_list": ["writing", "grammar"],
-            "essay": "This is a test essay for evaluation."
-        }
+        # Create test message; the receiver returns it once, then signals shutdown
         mock_message = Mock()
-        mock_message.body = [json.dumps(test_payload).encode('utf-8')]
-        
-        # Configure receiver to return message once then empty
-        message_call_count = 0
-        async def receive_messages_side_effect(*args, **kwargs):
-            nonlocal message_call_count
-            message_call_count += 1
-            if message_call_count == 1:
-                return [mock_message]
-            else:
-                shutdown_event.set()  # Trigger shutdown after first message
-                return []
-                
-        mock_receiver.receive_messages.side_effect = receive_messages_side_effect
-        mock_receiver.complete_message.return_value = None
+        mock_message.body = SAMPLE_BODY
         mock_prompt_processor.process_payload.return_value = "Essay evaluated successfully"
+        _, mock_receiver = wire_service_bus_client(
+            mock_service_bus_client, [mock_message], mock_prompt_processor.process_payload
+        )
+        mock_receiver.complete_message.return_value = None
 
         # Execute
-        await run_service_bus_processor_async()
+        await run_service_bus_processor_async(TEST_CONFIG)
 
         # Verify
-        mock_prompt_processor.process_payload.assert_called_once_with(test_payload)
+        mock_prompt_processor.process_payload.assert_called_once_with(SAMPLE_PAYLOAD)
         mock_receiver.complete_message.assert_called_once_with(mock_message)
+        mock_prompt_processor.__aexit__.assert_awaited_once()
 
 
 # Fixtures for reuse across tests
@@ -664,11 +967,7 @@ class TestIntegration:
 def mock_service_bus_message():
     """Fixture providing a mock Service Bus message."""
     message = Mock(spec=ServiceBusMessage)
-    test_payload = {
-        "skills_list": ["writing", "grammar", "coherence"],
-        "essay": "This is a test essay that needs to be evaluated for various skills."
-    }
-    message.body = [json.dumps(test_payload).encode('utf-8')]
+    message.body = SAMPLE_BODY
     return message
 
 
@@ -695,31 +994,21 @@ def test_environment():
 
 
 @pytest.mark.parametrize("missing_env_var", [
+    'SERVICE_BUS_CONNECTION_STR',
+    'SERVICE_BUS_QUEUE_NAME',
     'AI_MODEL_NAME',
     'AI_API_KEY',
     'AI_ENDPOINT',
     'API_VERSION'
 ])
-def test_validate_environment_variables_missing_specific_var(missing_env_var):
+def test_validate_environment_variables_missing_specific_var(missing_env_var, monkeypatch, required_env):
     """Test that validation fails for each specific missing environment variable."""
-    # Note: SERVICE_BUS_CONNECTION_STR and SERVICE_BUS_QUEUE_NAME are tested separately
-    # because they are module-level variables loaded at import time
-    
     # Setup - set all variables except the one being tested
-    all_vars = {
-        'SERVICE_BUS_CONNECTION_STR': 'fake_connection_string',
-        'SERVICE_BUS_QUEUE_NAME': 'test_queue',
-        'AI_MODEL_NAME': 'gpt-4o',
-        'AI_API_KEY': 'fake_api_key',
-        'AI_ENDPOINT': 'https://fake.endpoint.com',
-        'API_VERSION': '2024-02-01'
-    }
-    
-    # Use patch.dict to completely isolate the environment for this test
-    env_dict = all_vars.copy()
-    del env_dict[missing_env_var]  # Remove the variable we want to test as missing
-    
-    with patch.dict(os.environ, env_dict, clear=True):
-        # Execute & Verify
-        with pytest.raises(ValueError, match=f"Missing required environment variables: {missing_env_var}"):
-            validate_environment_variables()
\ No newline at end of file
+    for key, value in required_env.items():
+        if key != missing_env_var:
+            monkeypatch.setenv(key, value)
+    monkeypatch.delenv(missing_env_var, raising=False)
+
+    # Execute & Verify
+    with pytest.raises(ValueError, match=f"Missing required environment variables: {missing_env_var}"):
+        validate_environment_variables()
@@ -1,14 +1,9 @@
 import pytest
-import os
-import sys
 from unittest.mock import Mock, patch, MagicMock
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.connectors.ai.azure_ai_inference import AzureAIInferenceChatCompletion
 
-# Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from kernel import ProviderType, KernelFactory
 
 
@@ -0,0 +1,59 @@
+import pytest
+import logging
+
+import logging_setup
+from logging_setup import configure_logging, LOG_FORMAT
+
+
+class TestConfigureLogging:
+    """Test suite for the shared logging configuration."""
+
+    def setup_method(self):
+        """Reset logging configuration before each test."""
+        self.root_logger = logging.getLogger()
+        self.original_handlers = list(self.root_logger.handlers)
+        logging_setup._configured = False
+
+    def teardown_method(self):
+        """Restore the root logger handlers after each test."""
+        self.root_logger.handlers = self.original_handlers
+        logging_setup._configured = False
+
+    def test_configure_logging_adds_console_handler(self):
+        """Test a single formatted console handler is attached to the root logger."""
+        # Execute
+        configure_logging()
+
+        # Verify
+        new_handlers = [h for h in self.root_logger.handlers if h not in self.original_handlers]
+        assert len(new_handlers) == 1
+        assert isinstance(new_handlers[0], logging.StreamHandler)
+        assert new_handlers[0].formatter._fmt == LOG_FORMAT
+
+    def test_configure_logging_is_idempotent(self):
+        """Test calling configure_logging twice does not duplicate the handler."""
+        # Execute
+        configure_logging()
+        configure_logging()
+
+        # Verify
+        new_handlers = [h for h in self.root_logger.handlers if h not in self.original_handlers]
+        assert len(new_handlers) == 1
+
+    def test_module_records_reach_root_handler(self):
+        """Test application module loggers propagate to the shared handler."""
+        # Setup
+        configure_logging()
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        self.root_logger.addHandler(handler)
+        module_logger = logging.getLogger("blob_client")
+        module_logger.setLevel(logging.INFO)
+
+        # Execute
+        module_logger.info("Template downloaded: %s", "essay.yaml")
+
+        # Verify
+        assert len(records) == 1
+        assert records[0].getMessage() == "Template downloaded: essay.yaml"
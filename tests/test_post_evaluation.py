@@ -1,12 +1,7 @@
 import pytest
 import json
-import os
-import sys
 from unittest.mock import Mock
 
-# Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from post_evaluation import PostEvaluation
 
 
@@ -140,6 +135,61 @@ class TestPostEvaluation:
         assert result_dict["result"] == "reprovado"
         assert result_dict["avg_score"] == 0
 
+    def test_evaluate_skills_zero_score_in_middle(self):
+        """Test a zero score in the middle of the list fails the essay even when the other scores are high."""
+        # Setup
+        skills_list = [
+            {"habilidade": "writing", "nota": 10},
+            {"habilidade": "grammar", "nota": 10},
+            {"habilidade": "coherence", "nota": 0},
+            {"habilidade": "creativity", "nota": 10},
+            {"habilidade": "argumentation", "nota": 10}
+        ]
+        skills_json = json.dumps(skills_list)
+        essay = "This is a test essay."
+        
+        # Execute
+        result = self.post_eval.evaluate_skills(skills_json, essay)
+        
+        # Verify
+        result_dict = json.loads(result)
+        assert result_dict == {"result": "reprovado", "avg_score": 0}
+
+    def test_evaluate_skills_malformed_entry_after_zero_score(self):
+        """Test scoring stops at the first zero, so a malformed entry after it is not reported."""
+        # Setup
+        skills_list = [
+            {"habilidade": "writing", "nota": 0},
+            "not a skill object"
+        ]
+        skills_json = json.dumps(skills_list)
+        essay = "This is a test essay."
+        
+        # Execute
+        result = self.post_eval.evaluate_skills(skills_json, essay)
+        
+        # Verify
+        result_dict = json.loads(result)
+        assert result_dict == {"result": "reprovado", "avg_score": 0}
+
+    def test_evaluate_skills_malformed_entry_before_zero_score(self):
+        """Test a malformed entry reached before any zero score is still reported as an error."""
+        # Setup
+        skills_list = [
+            "not a skill object",
+            {"habilidade": "writing", "nota": 0}
+        ]
+        skills_json = json.dumps(skills_list)
+        essay = "This is a test essay."
+        
+        # Execute
+        result = self.post_eval.evaluate_skills(skills_json, essay)
+        
+        # Verify
+        result_dict = json.loads(result)
+        assert "error" in result_dict
+        assert "Evaluation failed" in result_dict["error"]
+
     def test_evaluate_skills_json_string_input(self):
         """Test evaluate_skills with JSON string input."""
         # Setup
@@ -579,6 +629,29 @@ def test_evaluate_skills_score_scenarios(scores, expected_result, expected_avg):
     assert result_dict["avg_score"] == expected_avg
 
 
+# Integer scores skip int(); every other type must still convert exactly as int() would
+@pytest.mark.parametrize("nota", [
+    8, 0, 10, -1,               # int fast path
+    8.7, 9.0, True,             # non-int numbers
+    "7", " 6 ", "8.5", "invalid", None
+])
+def test_evaluate_skill_score_matches_int_conversion(nota):
+    """Test _evaluate_skill_score gives the same result as converting the score with int()."""
+    # Setup
+    post_eval = PostEvaluation()
+    try:
+        expected = int(nota)
+    except (ValueError, TypeError):
+        expected = 0
+    
+    # Execute
+    score = post_eval._evaluate_skill_score({"nota": nota})
+    
+    # Verify
+    assert score == expected
+    assert type(score) is int
+
+
 # Performance test
 def test_evaluate_skills_performance_large_dataset():
     """Test evaluate_skills performance with large dataset."""
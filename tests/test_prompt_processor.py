@@ -2,15 +2,12 @@ import pytest
 import asyncio
 import json
 import yaml
-import os
-import sys
 import gc
 from unittest.mock import Mock, patch, AsyncMock, MagicMock
 
-# Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from prompt_processor import PromptProcessor
+from kernel import ProviderType
+from ai_config import AIConfig
 from semantic_kernel.functions import KernelArguments
 from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
 
@@ -52,6 +49,31 @@ class TestPromptProcessor:
         mock_kernel.add_plugin.assert_called_once_with(mock_post_eval_instance, "PostEvaluationPlugin")
         assert processor.kernel == mock_kernel
 
+    @patch('prompt_processor.KernelFactory')
+    def test_prompt_processor_from_config(self, mock_kernel_factory):
+        """Test PromptProcessor can be built from an AIConfig."""
+        # Setup
+        mock_blob_client = Mock()
+        config = AIConfig(
+            model_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            endpoint=self.test_endpoint,
+            api_version=self.test_api_version
+        )
+
+        # Execute
+        processor = PromptProcessor.from_config(config, blob_client=mock_blob_client)
+
+        # Verify
+        mock_kernel_factory.create_kernel.assert_called_once_with(
+            ProviderType.AZURE_AI_INFERENCE,
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            endpoint=self.test_endpoint,
+            api_version=self.test_api_version
+        )
+        assert processor._blob_client is mock_blob_client
+
     @patch('prompt_processor.KernelFactory')
     def test_prompt_processor_init_default_provider(self, mock_kernel_factory):
         """Test PromptProcessor initialization with default provider type."""
@@ -88,7 +110,6 @@ class TestPromptProcessor:
         # Verify
         mock_kernel.add_plugin.assert_called_once_with(mock_post_eval_instance, "PostEvaluationPlugin")
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_string_input(self, mock_blob_client_class, mock_kernel_factory):
@@ -136,7 +157,6 @@ template_format: handlebars
         mock_kernel.invoke.assert_called_once()
         assert result == mock_response
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_dict_input(self, mock_blob_client_class, mock_kernel_factory):
@@ -185,7 +205,34 @@ template_format: handlebars
         kernel_args = args[1]  # Second argument should be KernelArguments
         assert isinstance(kernel_args, KernelArguments)
 
-    @pytest.mark.asyncio
+    @patch('prompt_processor.KernelFactory')
+    async def test_process_payload_reuses_execution_settings(self, mock_kernel_factory):
+        """Test every invocation is given the same prebuilt execution settings."""
+        # Setup
+        mock_kernel = Mock()
+        mock_kernel_factory.create_kernel.return_value = mock_kernel
+        mock_kernel.add_function.return_value = Mock()
+        mock_kernel.invoke = AsyncMock(return_value=Mock())
+        injected_client = Mock()
+        injected_client.get_template.return_value = "name: Test\ntemplate: Test\ntemplate_format: handlebars"
+
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        )
+
+        # Execute
+        await processor.process_payload({"skills_list": ["writing"], "essay": "First essay"})
+        await processor.process_payload({"skills_list": ["grammar"], "essay": "Second essay"})
+
+        # Verify
+        first_args = mock_kernel.invoke.call_args_list[0][0][1]
+        second_args = mock_kernel.invoke.call_args_list[1][0][1]
+        assert isinstance(processor._execution_settings, PromptExecutionSettings)
+        assert list(first_args.execution_settings.values()) == [processor._execution_settings]
+        assert list(second_args.execution_settings.values()) == [processor._execution_settings]
+
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_skills_json_conversion(self, mock_blob_client_class, mock_kernel_factory):
@@ -225,7 +272,6 @@ template_format: handlebars
         # Note: This is a simplified check since we can't easily access the internal arguments
         mock_kernel.invoke.assert_called_once()
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_blob_client_error(self, mock_blob_client_class, mock_kernel_factory):
@@ -251,7 +297,6 @@ template_format: handlebars
         with pytest.raises(Exception, match="Blob not found"):
             await processor.process_payload(test_payload)
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_invalid_yaml(self, mock_blob_client_class, mock_kernel_factory):
@@ -277,7 +322,6 @@ template_format: handlebars
         with pytest.raises(yaml.YAMLError):
             await processor.process_payload(test_payload)
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     async def test_cleanup_with_aiohttp(self, mock_kernel_factory):
         """Test cleanup method with aiohttp available."""
@@ -296,7 +340,6 @@ template_format: handlebars
         # Verify
         assert processor.kernel is None
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.gc')
     async def test_cleanup_forces_garbage_collection(self, mock_gc, mock_kernel_factory):
@@ -316,7 +359,6 @@ template_format: handlebars
         # Verify
         mock_gc.collect.assert_called()
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     async def test_context_manager_cleanup(self, mock_kernel_factory):
         """Test that context manager properly calls cleanup."""
@@ -334,7 +376,39 @@ template_format: handlebars
         # Verify cleanup was called (kernel should be None)
         assert processor.kernel is None
 
-    @pytest.mark.asyncio
+    @patch('prompt_processor.KernelFactory')
+    async def test_context_manager_preloads_template(self, mock_kernel_factory):
+        """Test entering the context manager warms the injected template client's cache."""
+        # Setup
+        mock_kernel_factory.create_kernel.return_value = Mock()
+        injected_client = Mock()
+
+        # Execute
+        async with PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        ):
+            # Verify
+            injected_client.get_template.assert_called_once_with()
+
+    @patch('prompt_processor.KernelFactory')
+    async def test_context_manager_preload_failure_is_not_fatal(self, mock_kernel_factory):
+        """Test a failed template preload does not prevent the processor from starting."""
+        # Setup
+        mock_kernel_factory.create_kernel.return_value = Mock()
+        injected_client = Mock()
+        injected_client.get_template.side_effect = FileNotFoundError("Template blob 'essay.yaml' not found.")
+
+        # Execute
+        async with PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        ) as processor:
+            # Verify
+            assert processor.kernel is not None
+
     @patch('prompt_processor.KernelFactory')
     async def test_context_manager_exception_handling(self, mock_kernel_factory):
         """Test that context manager handles exceptions properly."""
@@ -355,7 +429,6 @@ template_format: handlebars
         # Verify cleanup was still called
         assert processor.kernel is None
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_empty_skills_list(self, mock_blob_client_class, mock_kernel_factory):
@@ -391,7 +464,6 @@ template_format: handlebars
         assert result == mock_response
         mock_kernel.invoke.assert_called_once()
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.KernelFactory')
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_process_payload_missing_essay(self, mock_blob_client_class, mock_kernel_factory):
@@ -426,11 +498,136 @@ template_format: handlebars
         # Verify - should still work with empty essay
         assert result == mock_response
 
+    @patch('prompt_processor.KernelFactory')
+    @patch('prompt_processor.AzureBlobTemplateClient')
+    async def test_process_payload_reuses_template_client(self, mock_blob_client_class, mock_kernel_factory):
+        """Test that a single template client is reused across payloads."""
+        # Setup
+        mock_kernel = Mock()
+        mock_kernel_factory.create_kernel.return_value = mock_kernel
+        mock_blob_client = Mock()
+        mock_blob_client_class.return_value = mock_blob_client
+        mock_blob_client.get_template.return_value = "name: Test\ntemplate: Test\ntemplate_format: handlebars"
+        mock_kernel.add_function.return_value = Mock()
+        mock_kernel.invoke = AsyncMock(return_value=Mock())
+
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key
+        )
+
+        # Execute
+        await processor.process_payload({"skills_list": ["writing"], "essay": "First essay"})
+        await processor.process_payload({"skills_list": ["grammar"], "essay": "Second essay"})
+
+        # Verify
+        mock_blob_client_class.assert_called_once()
+        assert mock_blob_client.get_template.call_count == 2
+        assert mock_kernel.invoke.call_count == 2
+
+
+    @patch('prompt_processor.KernelFactory')
+    @patch('prompt_processor.AzureBlobTemplateClient')
+    async def test_process_payload_uses_injected_template_client(self, mock_blob_client_class, mock_kernel_factory):
+        """Test that an injected template client is used instead of creating a new one."""
+        # Setup
+        mock_kernel = Mock()
+        mock_kernel_factory.create_kernel.return_value = mock_kernel
+        mock_kernel.add_function.return_value = Mock()
+        mock_kernel.invoke = AsyncMock(return_value=Mock())
+        injected_client = Mock()
+        injected_client.get_template.return_value = "name: Test\ntemplate: Test\ntemplate_format: handlebars"
+
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        )
+
+        # Execute
+        await processor.process_payload({"skills_list": ["writing"], "essay": "Test essay"})
+
+        # Verify
+        injected_client.get_template.assert_called_once()
+        mock_blob_client_class.assert_not_called()
+
+    @patch('prompt_processor.KernelFactory')
+    async def test_process_payload_registers_function_once(self, mock_kernel_factory):
+        """Test the evaluation function is registered once and reused while the template is unchanged."""
+        # Setup
+        mock_kernel = Mock()
+        mock_kernel_factory.create_kernel.return_value = mock_kernel
+        mock_semantic_function = Mock()
+        mock_kernel.add_function.return_value = mock_semantic_function
+        mock_kernel.invoke = AsyncMock(return_value=Mock())
+        injected_client = Mock()
+        injected_client.get_template.return_value = "name: Test\ntemplate: Test\ntemplate_format: handlebars"
+
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        )
+
+        # Execute
+        await processor.process_payload({"skills_list": ["writing"], "essay": "First essay"})
+        await processor.process_payload({"skills_list": ["grammar"], "essay": "Second essay"})
+
+        # Verify
+        mock_kernel.add_function.assert_called_once()
+        for invoke_call in mock_kernel.invoke.call_args_list:
+            assert invoke_call[0][0] == mock_semantic_function
+
+    @patch('prompt_processor.KernelFactory')
+    async def test_process_payload_reregisters_changed_template(self, mock_kernel_factory):
+        """Test the evaluation function is registered again when the template changes."""
+        # Setup
+        mock_kernel = Mock()
+        mock_kernel_factory.create_kernel.return_value = mock_kernel
+        mock_kernel.add_function.return_value = Mock()
+        mock_kernel.invoke = AsyncMock(return_value=Mock())
+        injected_client = Mock()
+        injected_client.get_template.side_effect = [
+            "name: Test\ntemplate: Old\ntemplate_format: handlebars",
+            "name: Test\ntemplate: New\ntemplate_format: handlebars"
+        ]
+
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        )
+
+        # Execute
+        await processor.process_payload({"skills_list": ["writing"], "essay": "First essay"})
+        await processor.process_payload({"skills_list": ["writing"], "essay": "Second essay"})
+
+        # Verify
+        assert mock_kernel.add_function.call_count == 2
+        assert mock_kernel.add_function.call_args[1]["prompt"] == "name: Test\ntemplate: New\ntemplate_format: handlebars"
+
+    @patch('prompt_processor.KernelFactory')
+    async def test_cleanup_closes_template_client(self, mock_kernel_factory):
+        """Test that cleanup closes the template client."""
+        # Setup
+        mock_kernel_factory.create_kernel.return_value = Mock()
+        injected_client = Mock()
+        processor = PromptProcessor(
+            deployment_name=self.test_deployment_name,
+            api_key=self.test_api_key,
+            blob_client=injected_client
+        )
+
+        # Execute
+        await processor.cleanup()
+
+        # Verify
+        injected_client.close.assert_called_once()
+
 
 class TestPromptProcessorIntegration:
     """Integration tests for PromptProcessor."""
 
-    @pytest.mark.asyncio
     @patch('prompt_processor.AzureBlobTemplateClient')
     async def test_full_workflow_integration(self, mock_blob_client_class):
         """Test the complete workflow with real Kernel objects (mocked AI calls)."""
@@ -608,7 +805,6 @@ def mock_processor_dependencies():
     ({"skill": "value"}, dict),
     ([], list),
 ])
-@pytest.mark.asyncio
 async def test_process_payload_skills_list_variations(skills_input, expected_json_type, mock_processor_dependencies, sample_yaml_template):
     """Test process_payload with different types of skills_list input."""
     # Setup
@@ -639,7 +835,6 @@ async def test_process_payload_skills_list_variations(skills_input, expected_jso
 
 
 # Performance and memory tests
-@pytest.mark.asyncio
 async def test_multiple_process_payload_calls_memory_management():
     """Test that multiple process_payload calls don't cause memory leaks."""
     with patch('prompt_processor.KernelFactory') as mock_kernel_factory, \
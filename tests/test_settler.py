@@ -0,0 +1,177 @@
+import pytest
+import asyncio
+import logging
+from unittest.mock import Mock, AsyncMock, call
+
+from settler import MessageSettler
+
+# Enable async testing
+pytest_plugins = ('pytest_asyncio',)
+
+
+class TestMessageSettler:
+    """Test suite for batched message settlement."""
+
+    async def test_complete_message_is_deferred_until_flush(self):
+        """Test completing a message only queues it until the background flush runs."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_message = Mock()
+        settler = MessageSettler(mock_receiver, flush_interval=0.01)
+
+        # Execute
+        settler.start()
+        await settler.complete_message(mock_message)
+        queued_calls = mock_receiver.complete_message.call_count
+        await settler.close()
+
+        # Verify
+        assert queued_calls == 0
+        mock_receiver.complete_message.assert_called_once_with(mock_message)
+
+    async def test_settles_batch_concurrently(self):
+        """Test messages queued together are settled in one concurrent batch."""
+        # Setup
+        mock_receiver = AsyncMock()
+        in_flight = 0
+        max_in_flight = 0
+        async def complete_side_effect(message):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+        mock_receiver.complete_message.side_effect = complete_side_effect
+        messages = [Mock() for _ in range(5)]
+
+        # Execute
+        async with MessageSettler(mock_receiver, flush_interval=0.01) as settler:
+            for message in messages:
+                await settler.complete_message(message)
+
+        # Verify
+        assert mock_receiver.complete_message.call_count == 5
+        assert max_in_flight == 5
+
+    async def test_batches_are_capped_at_max_batch_size(self):
+        """Test no more than max_batch_size messages are settled at once."""
+        # Setup
+        mock_receiver = AsyncMock()
+        in_flight = 0
+        max_in_flight = 0
+        async def complete_side_effect(message):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+        mock_receiver.complete_message.side_effect = complete_side_effect
+
+        # Execute
+        async with MessageSettler(mock_receiver, max_batch_size=3, flush_interval=0.01) as settler:
+            for _ in range(7):
+                await settler.complete_message(Mock())
+
+        # Verify
+        assert mock_receiver.complete_message.call_count == 7
+        assert max_in_flight <= 3
+
+    async def test_completion_is_logged_after_settling(self, caplog):
+        """Test the completion is only logged once the receiver has settled the message."""
+        # Setup
+        mock_receiver = AsyncMock()
+        settler = MessageSettler(mock_receiver, flush_interval=0.01)
+        settler.start()
+
+        # Execute
+        with caplog.at_level(logging.INFO, logger='settler'):
+            await settler.complete_message(Mock())
+            queued_logs = list(caplog.messages)
+            await settler.close()
+
+        # Verify
+        assert "Message completed successfully" not in queued_logs
+        assert "Message completed successfully" in caplog.messages
+
+    async def test_failed_complete_is_not_logged_as_completed(self, caplog):
+        """Test a completion that falls back to abandon is not reported as completed."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_receiver.complete_message.side_effect = Exception("Lock lost")
+
+        # Execute
+        with caplog.at_level(logging.INFO, logger='settler'):
+            async with MessageSettler(mock_receiver, flush_interval=0.01) as settler:
+                await settler.complete_message(Mock())
+
+        # Verify
+        assert "Message completed successfully" not in caplog.messages
+        assert "Failed to complete message: Lock lost" in caplog.messages
+
+    async def test_abandon_message(self):
+        """Test abandoned messages are abandoned on the receiver."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_message = Mock()
+
+        # Execute
+        async with MessageSettler(mock_receiver, flush_interval=0.01) as settler:
+            await settler.abandon_message(mock_message)
+
+        # Verify
+        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+        mock_receiver.complete_message.assert_not_called()
+
+    async def test_abandon_is_logged_after_settling(self, caplog):
+        """Test the abandon is only logged once the receiver has settled the message."""
+        # Setup
+        mock_receiver = AsyncMock()
+        settler = MessageSettler(mock_receiver, flush_interval=0.01)
+        settler.start()
+
+        # Execute
+        with caplog.at_level(logging.INFO, logger='settler'):
+            await settler.abandon_message(Mock())
+            queued_logs = list(caplog.messages)
+            await settler.close()
+
+        # Verify
+        assert "Message abandoned successfully" not in queued_logs
+        assert "Message abandoned successfully" in caplog.messages
+
+    async def test_failed_complete_abandons_message(self):
+        """Test a message whose completion fails is abandoned instead."""
+        # Setup
+        mock_receiver = AsyncMock()
+        mock_message = Mock()
+        mock_receiver.complete_message.side_effect = Exception("Lock lost")
+
+        # Execute
+        async with MessageSettler(mock_receiver, flush_interval=0.01) as settler:
+            await settler.complete_message(mock_message)
+
+        # Verify
+        mock_receiver.abandon_message.assert_called_once_with(mock_message)
+
+    async def test_failed_settlement_does_not_stop_batch(self):
+        """Test one failing settlement does not prevent the rest of the batch."""
+        # Setup
+        mock_receiver = AsyncMock()
+        messages = [Mock(), Mock()]
+        mock_receiver.abandon_message.side_effect = [Exception("Abandon failed"), None]
+
+        # Execute (should not raise exception)
+        async with MessageSettler(mock_receiver, flush_interval=0.01) as settler:
+            for message in messages:
+                await settler.abandon_message(message)
+
+        # Verify
+        mock_receiver.abandon_message.assert_has_calls([call(m) for m in messages], any_order=True)
+
+    async def test_close_without_start(self):
+        """Test closing a settler that was never started is a no-op."""
+        # Setup
+        settler = MessageSettler(AsyncMock())
+
+        # Execute (should not raise exception)
+        await settler.close()